@@ -0,0 +1,720 @@
+"""Module for working with archive members directly in the archive file"""
+
+import contextlib
+import errno
+import fnmatch
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from vgio.quake import pak, wad
+
+
+__all__ = [
+    'MappedArchive',
+    'MappedFile',
+    'check_archive',
+    'check_directory',
+    'hasher',
+    'expand_member_paths',
+    'file_digest',
+    'open_member_path',
+    'reachable',
+    'read_checksums',
+    'select',
+    'split_member_path',
+    'target_path',
+    'verify',
+    'write_checksums',
+    'write_stream'
+]
+
+
+CHUNK_SIZE = 1024 * 1024
+
+glob_magic = re.compile(r'[*?[]')
+
+
+def hasher():
+    """Returns a new hash object for computing content digests.
+
+    Returns:
+        A hashlib hash object.
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_digest(filename):
+    """Computes the content digest of the given file.
+
+    Args:
+        filename: A path to the file.
+
+    Returns:
+        A hex digest string.
+    """
+    h = hasher()
+
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def select(info_list, name_index, include=None, exclude=None, regex=False):
+    """Selects archive members by name. Names without wildcards are checked
+    with a set lookup instead of being matched as patterns. Members are
+    returned in directory order.
+
+    Args:
+        info_list: A sequence of ArchiveInfo objects.
+
+        name_index: A dictionary mapping member names to ArchiveInfo objects.
+
+        include: Optional. A sequence of names or glob patterns to select. All
+            members are selected if empty.
+
+        exclude: Optional. A sequence of names or glob patterns to leave out.
+
+        regex: If True, patterns are regular expressions that may match
+            anywhere in a name.
+
+    Returns:
+        A tuple of the list of selected ArchiveInfo objects and a list of the
+        exact names that weren't found.
+    """
+    def compile(patterns):
+        names = set()
+        matchers = []
+
+        for pattern in patterns or []:
+            if regex:
+                matchers.append(re.compile(pattern).search)
+
+            elif glob_magic.search(pattern):
+                matchers.append(re.compile(fnmatch.translate(pattern)).match)
+
+            else:
+                names.add(pattern)
+
+        return names, matchers
+
+    include_names, include_matchers = compile(include)
+    exclude_names, exclude_matchers = compile(exclude)
+
+    if include_names or include_matchers:
+        candidates = [i for i in info_list if i.filename in include_names or any(m(i.filename) for m in include_matchers)]
+
+    else:
+        candidates = info_list
+
+    selected = [i for i in candidates if i.filename not in exclude_names and not any(m(i.filename) for m in exclude_matchers)]
+    unmatched = sorted(n for n in include_names if n not in name_index)
+
+    return selected, unmatched
+
+
+def reachable(info_list, name_index):
+    """Leaves out members that are shadowed by a later member with the same
+    name. Only the last member for a name can be read by name.
+
+    Args:
+        info_list: A sequence of ArchiveInfo objects.
+
+        name_index: A dictionary mapping member names to ArchiveInfo objects.
+
+    Returns:
+        A list of ArchiveInfo objects in the order of info_list.
+    """
+    return [i for i in info_list if name_index.get(i.filename) is i]
+
+
+def split_member_path(path):
+    """Splits a path of the form archive.pak:name, which names a file inside
+    a pak file, into the pak file path and the member name.
+
+    Args:
+        path: A file path or a member path.
+
+    Returns:
+        A tuple of the pak file path and the member name. The member name is
+        None if path doesn't name a member of an existing pak file.
+    """
+    archive, separator, name = path.rpartition(':')
+
+    if separator and archive.lower().endswith('.pak') and os.path.isfile(archive):
+        return archive, name
+
+    return path, None
+
+
+def expand_member_paths(paths):
+    """Expands glob patterns in member paths to a member path for each
+    matching file in the pak file. Other paths are passed through unchanged,
+    as are patterns that match nothing.
+
+    Args:
+        paths: An iterable of file paths or member paths.
+
+    Yields:
+        File paths or member paths. Matches are yielded in the order they are
+        stored in the pak file.
+    """
+    for path in paths:
+        archive, name = split_member_path(path)
+
+        if name is None or not glob_magic.search(name) or not pak.is_pakfile(archive):
+            yield path
+            continue
+
+        with pak.PakFile(archive) as pak_file:
+            name_index = pak_file.NameToInfo
+            info_list, _ = select(pak_file.infolist(), name_index, [name])
+
+        matches = [i.filename for i in reachable(info_list, name_index)]
+
+        if not matches:
+            yield path
+
+        for match in matches:
+            yield f'{archive}:{match}'
+
+
+@contextlib.contextmanager
+def open_member_path(path):
+    """Opens a file path or member path for reading. Members are read from
+    the memory mapped pak file, nothing is extracted to disk.
+
+    Example:
+        Basic usage::
+
+            with open_member_path('PAK0.PAK:maps/e1m1.bsp') as file:
+                data = file.read()
+
+    Args:
+        path: A file path or member path.
+
+    Yields:
+        A binary file-like object. For members it is a MappedFile.
+
+    Raises:
+        FileNotFoundError: If the pak file has no member by that name.
+    """
+    archive, name = split_member_path(path)
+
+    if name is None:
+        with open(path, 'rb') as file:
+            yield file
+
+        return
+
+    with pak.PakFile(archive) as pak_file:
+        info = pak_file.NameToInfo.get(name)
+
+    if info is None:
+        raise FileNotFoundError(errno.ENOENT, f'no member named {name} in {archive}', path)
+
+    with MappedArchive(archive) as mapped_archive, mapped_archive.open(info) as file:
+        yield file
+
+
+def verify(archive, info_list, jobs=None):
+    """Checks that members lie within the archive and hashes them on a pool of
+    worker threads.
+
+    Args:
+        archive: A MappedArchive object.
+
+        info_list: A sequence of ArchiveInfo objects.
+
+        jobs: Optional. The number of members to hash at a time.
+
+    Returns:
+        A list with a hex digest string, or the raised exception, for each
+        member in the same order as info_list.
+    """
+    def check(info):
+        try:
+            return archive.digest(info)
+
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(check, info_list))
+
+
+def check_archive(filename, info_list, name_index, write=False, check_missing=True, jobs=None):
+    """Tests archive members and compares them against filename.checksums
+    if it exists, or writes it.
+
+    Args:
+        filename: A path to the archive file.
+
+        info_list: A sequence of ArchiveInfo objects to test.
+
+        name_index: A dictionary mapping member names to ArchiveInfo objects.
+
+        write: If True, the checksums file is written instead of compared
+            against. It is only written if there are no errors.
+
+        check_missing: If True, names in the checksums file that aren't in
+            the archive, and members that aren't in the checksums file, are
+            errors.
+
+        jobs: Optional. The number of members to hash at a time.
+
+    Returns:
+        A tuple of a list of (name, message) tuples, one for each error, and
+        a dictionary mapping the names of reachable members that passed to a
+        dictionary with 'size' and 'digest' keys, in the order of info_list.
+
+    Raises:
+        ValueError: If the checksums file isn't a valid checksums file.
+    """
+    checksums_file = f'{filename}.checksums'
+    checksums = None if write else read_checksums(checksums_file)
+
+    with MappedArchive(filename) as archive:
+        results = verify(archive, info_list, jobs)
+
+    errors = []
+    entries = {}
+
+    reachable_infos = {id(i) for i in reachable(info_list, name_index)}
+
+    for info, result in zip(info_list, results):
+        if isinstance(result, Exception):
+            errors.append((info.filename, str(result)))
+            continue
+
+        # Shadowed members are only checked for lying within the archive
+        if id(info) not in reachable_infos:
+            continue
+
+        expected = checksums.get(info.filename) if checksums is not None else None
+
+        if expected is None and checksums is not None and check_missing:
+            errors.append((info.filename, 'not in checksums file'))
+
+        elif expected and (expected['size'], expected['digest']) != (info.file_size, result):
+            errors.append((info.filename, 'contents do not match checksums'))
+
+        else:
+            entries[info.filename] = {'size': info.file_size, 'digest': result}
+
+    if checksums is not None and check_missing:
+        for name in sorted(set(checksums) - set(name_index)):
+            errors.append((name, 'missing from archive'))
+
+    if write and not errors:
+        write_checksums(checksums_file, entries)
+
+    return errors, entries
+
+
+def check_directory(filename, archive_format):
+    """Checks that the header and directory of an archive are whole and lie
+    within the archive file.
+
+    Args:
+        filename: A path to the archive file.
+
+        archive_format: The vgio module for the archive format, pak or wad.
+
+    Raises:
+        ValueError: If the header or directory is truncated or corrupt.
+    """
+    with open(filename, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+
+        if size < archive_format.Header.size:
+            raise ValueError(f'{filename} is truncated or corrupt')
+
+        header = archive_format.Header.read(file)
+
+    if archive_format is wad:
+        directory_size = header.lump_count * wad.Entry.size
+
+    else:
+        directory_size = header.directory_size
+
+    if directory_size < 0 or directory_size % archive_format.Entry.size:
+        raise ValueError(f'{filename} is truncated or corrupt')
+
+    if header.directory_offset < 0 or header.directory_offset + directory_size > size:
+        raise ValueError(f'directory lies outside of {filename}')
+
+
+def read_checksums(filename):
+    """Reads a checksums file written by write_checksums().
+
+    Args:
+        filename: A path to the checksums file.
+
+    Returns:
+        A dictionary mapping member names to a dictionary with 'size' and
+        'digest' keys. None if the file doesn't exist.
+
+    Raises:
+        ValueError: If the file isn't a valid checksums file.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    with open(filename) as file:
+        checksums = json.load(file)
+
+    if not isinstance(checksums, dict) or checksums.get('version') != 1:
+        raise ValueError(f'{filename} is not a checksums file')
+
+    return checksums['entries']
+
+
+def write_checksums(filename, entries):
+    """Writes a checksums file. The file is replaced atomically.
+
+    Args:
+        filename: A path to the checksums file.
+
+        entries: A dictionary mapping member names to a dictionary with 'size'
+            and 'digest' keys.
+    """
+    temp_filename = f'{filename}.tmp'
+
+    with open(temp_filename, 'w') as file:
+        json.dump({'version': 1, 'entries': entries}, file, indent=1, sort_keys=True)
+
+    os.replace(temp_filename, filename)
+
+
+def target_path(path, filename):
+    """Returns the path the given archive member will be extracted to. Mirrors
+    the sanitization done by vgio when extracting.
+
+    Args:
+        path: The directory to extract to.
+
+        filename: The archive member name.
+
+    Returns:
+        A normalized file path.
+    """
+    filename = filename.replace('/', os.path.sep)
+
+    if os.path.altsep:
+        filename = filename.replace(os.path.altsep, os.path.sep)
+
+    filename = os.path.splitdrive(filename)[1]
+    invalid_parts = ('', os.path.curdir, os.path.pardir)
+    parts = [p for p in filename.split(os.path.sep) if p not in invalid_parts]
+
+    if sys.platform == 'win32':
+        table = str.maketrans(':<>|"?*', '_' * 7)
+        parts = [p.translate(table).rstrip('.') for p in parts]
+        parts = [p for p in parts if p]
+
+    return os.path.normpath(os.path.join(path, *parts))
+
+
+def write_stream(archive_file, info, file):
+    """Writes the contents of a file-like object to an archive as a new
+    member. Data is copied in fixed size chunks.
+
+    Args:
+        archive_file: An ArchiveFile object open for writing.
+
+        info: An ArchiveInfo object for the new member.
+
+        file: A binary file-like object to read from.
+
+    Returns:
+        The hex digest of the written data.
+    """
+    h = hasher()
+    info.file_offset = archive_file.fp.tell()
+
+    with archive_file.open(info, 'w') as dest:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+            dest.write(chunk)
+
+    return h.hexdigest()
+
+
+class MappedArchive(object):
+    """Memory maps an archive file so member byte ranges can be read or copied
+    without going through Python file objects.
+
+    Example:
+        Basic usage::
+
+            with MappedArchive('PAK0.PAK') as archive:
+                archive.copy(info, 'out/progs/player.mdl')
+
+    Args:
+        filename: A path to the archive file.
+
+    Attributes:
+        size: The size of the archive file in bytes.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.mmap = None
+
+        # An empty file can't be mapped
+        if self.size:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._copy_file_range = hasattr(os, 'copy_file_range')
+        self._sendfile = hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if self.mmap:
+            self.mmap.close()
+            self.mmap = None
+
+        self.file.close()
+
+    def check(self, info):
+        """Raises an error if the given member does not lie entirely within
+        the archive file.
+
+        Args:
+            info: An ArchiveInfo object.
+
+        Raises:
+            ValueError: If the member is out of bounds.
+        """
+        start = info.file_offset
+        stop = start + info.file_size
+
+        if start < 0 or info.file_size < 0 or stop > self.size:
+            raise ValueError(f'entry lies outside of the archive ({start}:{stop} of {self.size} bytes)')
+
+    def view(self, info):
+        """Returns a zero-copy view of the given member's bytes. The view must
+        be released before the archive is closed.
+
+        Args:
+            info: An ArchiveInfo object.
+
+        Returns:
+            A memoryview object.
+        """
+        self.check(info)
+
+        if not info.file_size:
+            return memoryview(b'')
+
+        return memoryview(self.mmap)[info.file_offset:info.file_offset + info.file_size]
+
+    def open(self, info):
+        """Returns a read-only binary file-like object over the given member's
+        bytes. Reads are served from the mapped archive.
+
+        Args:
+            info: An ArchiveInfo object.
+
+        Returns:
+            A MappedFile object.
+        """
+        return MappedFile(self.view(info))
+
+    def digest(self, info):
+        """Computes the content digest of the given member.
+
+        Args:
+            info: An ArchiveInfo object.
+
+        Returns:
+            A hex digest string.
+        """
+        h = hasher()
+
+        with self.view(info) as view:
+            h.update(view)
+
+        return h.hexdigest()
+
+    def same(self, info, path, compare_digest=False):
+        """Checks if a file has the same contents as the given member.
+
+        Args:
+            info: An ArchiveInfo object.
+
+            path: The file path to compare against.
+
+            compare_digest: If True, the contents are compared by digest.
+                Otherwise only the sizes are compared.
+
+        Returns:
+            True if the file matches the member.
+        """
+        try:
+            if os.path.getsize(path) != info.file_size:
+                return False
+
+        except OSError:
+            return False
+
+        if compare_digest:
+            return self.digest(info) == file_digest(path)
+
+        return True
+
+    def copy(self, info, path):
+        """Writes the given member's bytes to a file. The kernel copies the
+        data directly when possible, otherwise it is written from the mapped
+        archive without an intermediate copy.
+
+        The data is written to a temporary file which is then renamed, so a
+        file at the given path is never partially written.
+
+        Args:
+            info: An ArchiveInfo object.
+
+            path: The file path to write to.
+        """
+        self.check(info)
+        temp_path = f'{path}.part'
+
+        try:
+            self._copy(info, temp_path)
+            os.replace(temp_path, path)
+
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+
+    def _copy(self, info, path):
+        with open(path, 'wb') as out_file:
+            offset = info.file_offset
+            remaining = info.file_size
+
+            while remaining and self._copy_file_range:
+                try:
+                    count = os.copy_file_range(self.file.fileno(), out_file.fileno(), remaining, offset)
+
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                        raise
+
+                    self._copy_file_range = False
+                    break
+
+                if not count:
+                    raise EOFError('entry is truncated')
+
+                offset += count
+                remaining -= count
+
+            while remaining and self._sendfile:
+                try:
+                    count = os.sendfile(out_file.fileno(), self.file.fileno(), offset, remaining)
+
+                except OSError as e:
+                    if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                        raise
+
+                    self._sendfile = False
+                    break
+
+                if not count:
+                    raise EOFError('entry is truncated')
+
+                offset += count
+                remaining -= count
+
+            if remaining:
+                with memoryview(self.mmap) as view:
+                    out_file.write(view[offset:offset + remaining])
+
+
+class MappedFile(io.RawIOBase):
+    """A read-only binary file-like object over a memoryview. Closing the file
+    releases the view.
+
+    Args:
+        view: A memoryview of bytes.
+    """
+
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def getbuffer(self):
+        """Returns a zero-copy view of the file's bytes, like
+        io.BytesIO.getbuffer(). The view must be released before the
+        archive is closed.
+
+        Returns:
+            A memoryview object.
+        """
+        return self._view[:]
+
+    def readinto(self, buffer):
+        view = self._view[self._position:self._position + len(buffer)]
+        count = len(view)
+        buffer[:count] = view
+        self._position += count
+
+        return count
+
+    def readall(self):
+        return self.read(len(self._view) - self._position)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._view) - self._position
+
+        data = self._view[self._position:self._position + size].tobytes()
+        self._position += len(data)
+
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+
+        self._position = offset
+
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+
+        super().close()
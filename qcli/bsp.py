@@ -0,0 +1,345 @@
+"""Module for reading bsp files one lump at a time
+
+A MappedBsp memory maps the file and only parses the header when opened.
+Lumps are decoded with the vgio structures the first time they are accessed,
+so a tool that only needs textures never reads the geometry. With NumPy,
+lumps can also be read as structured arrays.
+"""
+
+import contextlib
+import inspect
+import mmap
+import re
+import struct
+
+from vgio.quake.bsp import bsp29, bsp29a
+
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
+
+
+__all__ = ['LUMPS', 'MappedBsp']
+
+# Lump names in directory order
+LUMPS = (
+    'entities',
+    'planes',
+    'miptextures',
+    'vertexes',
+    'visibilities',
+    'nodes',
+    'texture_infos',
+    'faces',
+    'lighting',
+    'clip_nodes',
+    'leafs',
+    'mark_surfaces',
+    'edges',
+    'surf_edges',
+    'models'
+)
+
+# Lumps that are arrays of a single structure
+_structures = {
+    'planes': 'Plane',
+    'vertexes': 'Vertex',
+    'nodes': 'Node',
+    'texture_infos': 'TextureInfo',
+    'faces': 'Face',
+    'clip_nodes': 'ClipNode',
+    'leafs': 'Leaf',
+    'edges': 'Edge',
+    'models': 'Model'
+}
+
+
+# NumPy types of struct format characters
+_numpy_types = {
+    'b': 'i1',
+    'B': 'u1',
+    'h': '<i2',
+    'H': '<u2',
+    'i': '<i4',
+    'I': '<u4',
+    'l': '<i4',
+    'L': '<u4',
+    'f': '<f4'
+}
+
+
+def _dtype(class_):
+    # One field per value, named after the matching constructor argument
+    names = list(inspect.signature(class_.__init__).parameters)[1:]
+    codes = [c for count, c in re.findall(r'(\d*)([a-zA-Z])', class_.format) for _ in range(int(count or 1))]
+
+    return numpy.dtype(list(zip(names, [_numpy_types[c] for c in codes])))
+
+
+class _Lump(object):
+    """A lump attribute that is decoded on first access. The decoded value is
+    stored on the instance, which hides the descriptor from then on."""
+
+    def __init__(self, decode):
+        self.decode = decode
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        if callable(self.decode):
+            value = self.decode(instance)
+
+        else:
+            value = instance._decode(self.decode)
+
+        instance.__dict__[self.name] = value
+
+        return value
+
+
+class MappedBsp(object):
+    """Reads lumps of a bsp file on demand.
+
+    Example:
+        Basic usage::
+
+            with MappedBsp('e1m1.bsp') as bsp_file:
+                names = [n for n in bsp_file.texture_names if n]
+
+    Args:
+        file: A path to the bsp file or a binary file-like object. The
+            buffer of a file with a getbuffer() method, like io.BytesIO or
+            MappedFile, is read in place. Other files are memory mapped.
+
+    Lumps are decoded into the same objects vgio uses and are available as
+    attributes named as in LUMPS. The visibilities, lighting and
+    mark_surfaces lumps are only available as bytes through lump().
+    Miptexture pixels are bytes. The texture_names attribute lists the name
+    of each miptexture, None for missing textures, reading only the
+    miptexture headers.
+
+    Attributes:
+        version: The bsp version. 29 for Quake bsp files, or b'BSP2'.
+
+        lumps: A dictionary mapping lump names to (offset, length) tuples.
+
+    Raises:
+        BadBspFile: If the file isn't a bsp file or a lump lies outside of
+            it.
+    """
+
+    def __init__(self, file):
+        # Buffers of in-memory files are used in place
+        if hasattr(file, 'getbuffer'):
+            self.data = file.getbuffer()
+
+        else:
+            with contextlib.ExitStack() as stack:
+                if not hasattr(file, 'fileno'):
+                    file = stack.enter_context(open(file, 'rb'))
+
+                try:
+                    self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+                except ValueError:
+                    raise bsp29.BadBspFile('Not a bsp file')
+
+        try:
+            identity = bytes(self.data[:4])
+
+            if identity == bsp29a.IDENTITY:
+                self.version = bsp29a.IDENTITY
+                self.factory = bsp29a.Bsp.factory
+
+            elif identity == struct.pack('<i', bsp29.VERSION):
+                self.version = bsp29.VERSION
+                self.factory = bsp29.Bsp.factory
+
+            else:
+                raise bsp29.BadBspFile('Not a bsp file')
+
+            if len(self.data) < self.factory.Header.size:
+                raise bsp29.BadBspFile('Not a bsp file')
+
+            header = struct.unpack_from(self.factory.Header.format, self.data)
+            self.lumps = dict(zip(LUMPS, zip(header[1::2], header[2::2])))
+
+            for name, (offset, length) in self.lumps.items():
+                if offset < 0 or length < 0 or offset + length > len(self.data):
+                    raise bsp29.BadBspFile(f'{name} lump lies outside of the file')
+
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, memoryview):
+            self.data.release()
+
+        else:
+            self.data.close()
+
+    def lump(self, name):
+        """Returns a zero-copy view of the given lump's bytes. The view must
+        be released before the file is closed.
+
+        Args:
+            name: A lump name from LUMPS.
+
+        Returns:
+            A memoryview object.
+        """
+        offset, length = self.lumps[name]
+
+        return memoryview(self.data)[offset:offset + length]
+
+    def array(self, name):
+        """Returns a lump as a NumPy array. Requires NumPy.
+
+        Lumps that are arrays of a structure are returned as structured
+        arrays with a field per value, named after the arguments of the vgio
+        structure's constructor. For example, the faces array has
+        plane_number, first_edge and number_of_edges fields. The surf_edges
+        lump is returned as an array of integers.
+
+        The array is a copy, so it stays valid after the file is closed.
+
+        Args:
+            name: A lump name from LUMPS.
+
+        Returns:
+            A NumPy array.
+        """
+        if name == 'surf_edges':
+            dtype = numpy.dtype('<i4')
+
+        else:
+            dtype = _dtype(getattr(self.factory, _structures[name]))
+
+        with self.lump(name) as view:
+            return numpy.frombuffer(view, dtype, len(view) // dtype.itemsize).copy()
+
+    def _decode(self, name):
+        class_ = getattr(self.factory, _structures[name])
+
+        with self.lump(name) as view:
+            size = len(view) - len(view) % class_.size
+            return [class_(*s) for s in struct.iter_unpack(class_.format, view[:size])]
+
+    def _miptexture_offsets(self):
+        offset, length = self.lumps['miptextures']
+
+        if length < 4:
+            return []
+
+        count, = struct.unpack_from('<i', self.data, offset)
+
+        if count < 0 or 4 + count * 4 > length:
+            raise bsp29.BadBspFile('miptextures lump is truncated')
+
+        return [o if o == -1 else offset + o for o in struct.unpack_from(f'<{count}i', self.data, offset + 4)]
+
+    def _miptexture_header(self, offset):
+        lump_offset, lump_length = self.lumps['miptextures']
+
+        if offset < lump_offset or offset + bsp29.Miptexture.size > lump_offset + lump_length:
+            raise bsp29.BadBspFile('miptexture lies outside of the miptextures lump')
+
+        name, width, height, *offsets = struct.unpack_from(bsp29.Miptexture.format, self.data, offset)
+        pixels_size = width * height * 85 // 64
+
+        if width < 0 or height < 0 or offset + bsp29.Miptexture.size + pixels_size > lump_offset + lump_length:
+            raise bsp29.BadBspFile('miptexture is truncated')
+
+        return name.split(b'\x00')[0].decode('ascii'), width, height, offsets, pixels_size
+
+    def miptexture_data(self):
+        """Returns each miptexture as it would be stored in a wad file, without
+        decoding the pixels. The name is cleared of anything after its
+        terminating null.
+
+        Returns:
+            A list of bytes, None for missing textures.
+        """
+        result = []
+
+        for offset in self._miptexture_offsets():
+            if offset == -1:
+                result.append(None)
+                continue
+
+            name, width, height, offsets, pixels_size = self._miptexture_header(offset)
+            start = offset + bsp29.Miptexture.size
+            header = struct.pack(bsp29.Miptexture.format, name.encode('ascii'), width, height, *offsets)
+
+            result.append(header + bytes(self.data[start:start + pixels_size]))
+
+        return result
+
+    def _entities(self):
+        with self.lump('entities') as view:
+            return bytes(view).decode('cp437').strip('\x00')
+
+    def _miptextures(self):
+        result = []
+
+        for offset in self._miptexture_offsets():
+            if offset == -1:
+                result.append(None)
+                continue
+
+            miptexture = bsp29.Miptexture()
+            name, width, height, offsets, pixels_size = self._miptexture_header(offset)
+            start = offset + bsp29.Miptexture.size
+
+            miptexture.name = name
+            miptexture.width = width
+            miptexture.height = height
+            miptexture.offsets = tuple(offsets)
+            miptexture.pixels = bytes(self.data[start:start + pixels_size])
+            result.append(miptexture)
+
+        return result
+
+    def _texture_names(self):
+        result = []
+
+        for offset in self._miptexture_offsets():
+            if offset == -1:
+                result.append(None)
+                continue
+
+            name, *_ = self._miptexture_header(offset)
+            result.append(name)
+
+        return result
+
+    def _surf_edges(self):
+        with self.lump('surf_edges') as view:
+            return struct.unpack(f'<{len(view) // 4}i', view[:len(view) // 4 * 4])
+
+    entities = _Lump(_entities)
+    miptextures = _Lump(_miptextures)
+    texture_names = _Lump(_texture_names)
+    surf_edges = _Lump(_surf_edges)
+    planes = _Lump('planes')
+    vertexes = _Lump('vertexes')
+    nodes = _Lump('nodes')
+    texture_infos = _Lump('texture_infos')
+    faces = _Lump('faces')
+    clip_nodes = _Lump('clip_nodes')
+    leafs = _Lump('leafs')
+    edges = _Lump('edges')
+    models = _Lump('models')
@@ -1,7 +1,13 @@
 from collections import namedtuple
 from functools import lru_cache
 
-from vgio.quake import bsp
+from qcli.bsp import MappedBsp
+
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
 
 
 def dot(v0, v1):
@@ -18,7 +24,7 @@ def subtract(v0, v1):
     return v0[0] - v1[0], v0[1] - v1[1], v0[2] - v1[2]
 
 
-__all__ = ['Bsp']
+__all__ = ['Bsp', 'Mesh']
 
 
 class Bsp(object):
@@ -31,8 +37,8 @@ class Bsp(object):
 
     @staticmethod
     def open(file):
-        bsp_file = bsp.Bsp.open(file)
-        bsp_file.close()
+        # Only the lumps needed for geometry and texture names are read
+        bsp_file = MappedBsp(file)
 
         def get_models():
             return [process_model(m) for m in bsp_file.models]
@@ -101,12 +107,8 @@ class Bsp(object):
                 return ''
 
             tex_info = bsp_file.texture_infos[bsp_face.texture_info]
-            miptex = bsp_file.miptextures[tex_info.miptexture_number]
-
-            if not miptex:
-                return ''
 
-            return miptex.name
+            return bsp_file.texture_names[tex_info.miptexture_number] or ''
 
         @lru_cache(maxsize=None)
         def get_uvs(face_index):
@@ -134,29 +136,137 @@ class Bsp(object):
             bsp_face = bsp_file.faces[face_index]
             return bsp_file.planes[bsp_face.plane_number]
 
-        models = get_models()
+        with bsp_file:
+            models = get_models()
+
         result = Bsp(models)
 
         return result
 
 
+class Mesh(object):
+    """The geometry of a bsp file as contiguous NumPy arrays. Requires NumPy.
+
+    Mesh.open() builds the arrays from the raw lumps with vectorized gathers
+    instead of building an object for every face, edge and vertex.
+
+    Attributes:
+        vertexes: A float32 array of vertex positions with shape (n, 3).
+
+        face_offsets: An array with one more entry than there are faces. The
+            edges of face i are edges[face_offsets[i]:face_offsets[i + 1]].
+
+        edges: An array of vertex index pairs with shape (n, 2). Each face's
+            edges are in winding order, so edges[:, 0] lists the vertexes
+            of each face in order.
+
+        plane_normals: A float32 array of the normal of each face's plane
+            with shape (n, 3).
+
+        texture_ids: An array of the miptexture number of each face, -1 if
+            the face has no texture.
+
+        texture_names: A list of the name of each miptexture, '' if missing.
+
+        models: An array of (first_face, number_of_faces) pairs with shape
+            (n, 2).
+    """
+
+    __slots__ = (
+        'vertexes',
+        'face_offsets',
+        'edges',
+        'plane_normals',
+        'texture_ids',
+        'texture_names',
+        'models'
+    )
+
+    def __init__(self, vertexes, face_offsets, edges, plane_normals, texture_ids, texture_names, models):
+        self.vertexes = vertexes
+        self.face_offsets = face_offsets
+        self.edges = edges
+        self.plane_normals = plane_normals
+        self.texture_ids = texture_ids
+        self.texture_names = texture_names
+        self.models = models
+
+    @staticmethod
+    def open(file):
+        with MappedBsp(file) as bsp_file:
+            vertexes = bsp_file.array('vertexes')
+            edges = bsp_file.array('edges')
+            surf_edges = bsp_file.array('surf_edges')
+            faces = bsp_file.array('faces')
+            planes = bsp_file.array('planes')
+            texture_infos = bsp_file.array('texture_infos')
+            models = bsp_file.array('models')
+            texture_names = bsp_file.texture_names
+
+        def columns(array, *names):
+            return numpy.stack([array[n] for n in names], axis=1)
+
+        counts = faces['number_of_edges'].astype(numpy.int64)
+        face_offsets = numpy.zeros(len(faces) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=face_offsets[1:])
+
+        # Surfedge index of every edge of every face
+        first_edges = faces['first_edge'].astype(numpy.int64)
+        surf_edge_indexes = numpy.repeat(first_edges - face_offsets[:-1], counts) + numpy.arange(face_offsets[-1])
+        face_surf_edges = surf_edges[surf_edge_indexes]
+
+        # Negative surfedges use their edge backwards
+        face_edges = columns(edges, 'vertex_0', 'vertex_1').astype(numpy.int64)[numpy.abs(face_surf_edges)]
+        reversed_edges = face_surf_edges < 0
+        face_edges[reversed_edges] = face_edges[reversed_edges, ::-1]
+
+        plane_normals = columns(planes, 'normal_x', 'normal_y', 'normal_z')[faces['plane_number']]
+
+        texture_infos_indexes = faces['texture_info']
+        texture_ids = texture_infos['miptexture_number'][texture_infos_indexes]
+        texture_ids[texture_infos_indexes == -1] = -1
+
+        missing = numpy.array([n is None for n in texture_names] + [True])
+        texture_ids[missing[texture_ids]] = -1
+
+        return Mesh(
+            columns(vertexes, 'x', 'y', 'z'),
+            face_offsets,
+            face_edges,
+            plane_normals,
+            texture_ids,
+            [n or '' for n in texture_names],
+            columns(models, 'first_face', 'number_of_faces')
+        )
+
+
 class Model(object):
     __slots__ = (
-        'faces'
+        'faces',
+        '_vertexes',
+        '_edges'
     )
 
     def __init__(self, faces):
         self.faces = faces
+        self._vertexes = None
+        self._edges = None
 
+    # Computed on first access and kept on the instance, so they are freed
+    # along with the model
     @property
-    @lru_cache(maxsize=None)
     def vertexes(self):
-        return list(set([v for f in self.faces for v in f.vertexes]))
+        if self._vertexes is None:
+            self._vertexes = list(set([v for f in self.faces for v in f.vertexes]))
+
+        return self._vertexes
 
     @property
-    @lru_cache(maxsize=None)
     def edges(self):
-        return list(set([e for f in self.faces for e in f.edges]))
+        if self._edges is None:
+            self._edges = list(set([e for f in self.faces for e in f.edges]))
+
+        return self._edges
 
 
 class Face(object):
@@ -10,9 +10,10 @@ import os
 import sys
 
 
-from vgio.quake import bsp
+from vgio.quake import bsp, pak
 
 import qcli
+from qcli.archive import expand_member_paths, open_member_path, split_member_path
 from qcli.bsp2svg import converter
 from qcli.common import Parser, ResolvePathAction
 
@@ -20,7 +21,10 @@ from qcli.common import Parser, ResolvePathAction
 def main():
     parser = Parser(
         prog='bsp2svg',
-        description='Create an svg document from the given bsp file.',
+        description='Create an svg document from the given bsp file. A bsp '
+                    'file in a pak file can be given as file.pak:maps/e1m1.bsp, '
+                    'or as a glob pattern like \'file.pak:maps/*.bsp\' to '
+                    'convert every match.',
         epilog='example: bsp2svg e1m1.bsp => creates the svg file e1m1.svg'
     )
 
@@ -73,22 +77,43 @@ def main():
 
     args = parser.parse_args()
 
-    if not bsp.is_bspfile(args.file):
-        print(f'{parser.prog}: cannot find or open {args.file}', file=sys.stderr)
+    files = list(expand_member_paths([args.file]))
 
-    # Validate or create out file
-    if args.dest == os.getcwd():
-        svg_path = os.path.dirname(args.file)
-        svg_name = f'{os.path.basename(args.file).split(".")[0]}_{args.projection_axis}.svg'
-        args.dest = os.path.join(svg_path, svg_name)
+    if len(files) > 1 and args.dest != os.getcwd():
+        parser.error(f'argument -d: not allowed when {args.file} matches several files')
 
-    dest_dir = os.path.dirname(args.dest) or '.'
-    if not os.path.exists(dest_dir):
-        os.makedirs(dest_dir, exist_ok=True)
+    errors = False
 
-    converter.convert(args.file, args.dest, args)
+    for file in files:
+        try:
+            with open_member_path(file) as bsp_file:
+                is_bspfile = bsp.is_bspfile(bsp_file)
 
-    sys.exit(0)
+        except (OSError, pak.BadPakFile):
+            is_bspfile = False
+
+        if not is_bspfile:
+            print(f'{parser.prog}: cannot find or open {file}', file=sys.stderr)
+            errors = True
+            continue
+
+        # Validate or create out file. Maps read from a pak file are written
+        # next to it and named after the member
+        dest = args.dest
+
+        if dest == os.getcwd():
+            archive, name = split_member_path(file)
+            svg_path = os.path.dirname(archive)
+            svg_name = f'{os.path.basename(name or archive).split(".")[0]}_{args.projection_axis}.svg'
+            dest = os.path.join(svg_path, svg_name)
+
+        dest_dir = os.path.dirname(dest) or '.'
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir, exist_ok=True)
+
+        converter.convert(file, dest, args)
+
+    sys.exit(1 if errors else 0)
 
 
 if __name__ == '__main__':
@@ -3,7 +3,15 @@ import os
 import svgwrite
 from progress.bar import IncrementalBar
 
-from .api import Bsp
+from qcli.archive import open_member_path
+
+from .api import Bsp, Mesh
+
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
 
 
 def simplify_number(number):
@@ -19,20 +27,12 @@ def simplify_number(number):
     return int(number) if int(number) == number else number
 
 
-def convert(bsp_file, svg_file, args):
-    """Renders the given bsp file to an svg file.
-
-    Args:
-        bsp_file: A file path to the bsp file to read.
-
-        svg_file: A file path to the svg file to write.
-
-        args: An argsparse args object with additional arguments.
-    """
-    print(f'Reading {os.path.basename(bsp_file)}')
-    bsp_file = Bsp.open(bsp_file)
+def _object_polygons(file, args):
+    """Returns the faces to draw as polygons in drawing coordinates, and the
+    bounds of the drawing. Faces are read into objects."""
+    bsp_file = Bsp.open(file)
     projection_axis = args.projection_axis
-    
+
     # Filter faces
     faces = [face for model in bsp_file.models for face in model.faces]
     ignore_textures = ['clip', 'hint', 'trigger'] + args.ignore
@@ -51,6 +51,93 @@ def convert(bsp_file, svg_file, args):
     drawing_min_y = min(drawing_ys)
     drawing_max_y = max(drawing_ys)
 
+    if projection_axis == 'x':
+        faces.sort(key=lambda f: f.vertexes[0].x)
+    elif projection_axis == 'y':
+        faces.sort(key=lambda f: f.vertexes[0].y)
+    elif projection_axis == 'z':
+        faces.sort(key=lambda f: f.vertexes[0].z)
+
+    def vs_picker(vertexes):
+        if projection_axis == 'x':
+            return vertexes[1:3]
+        elif projection_axis == 'y':
+            return vertexes[0], vertexes[2]
+        elif projection_axis == 'z':
+            return vertexes[:2]
+
+    polygons = []
+
+    for face in faces:
+        # Process the vertices into points
+        points = [vs_picker(v) for v in face.vertexes]
+        points = list(map(lambda p: (p[0], drawing_max_y - p[1] + drawing_min_y), points))
+        polygons.append(points)
+
+    return polygons, (drawing_min_x, drawing_max_x, drawing_min_y, drawing_max_y)
+
+
+def _array_polygons(file, args):
+    """Returns the same as _object_polygons(), working on whole arrays."""
+    mesh = Mesh.open(file)
+    axis = 'xyz'.index(args.projection_axis)
+    drawing_axes = [i for i in range(3) if i != axis]
+
+    faces = [numpy.arange(first, first + count) for first, count in mesh.models.tolist()]
+    faces = numpy.concatenate(faces) if faces else numpy.empty(0, dtype=numpy.int64)
+
+    # Filter faces. Faces without a texture have a texture id of -1, which
+    # picks the trailing ''
+    ignore_textures = ['clip', 'hint', 'trigger'] + args.ignore
+    ignored = numpy.array([n.startswith('sky') or n in ignore_textures for n in mesh.texture_names + ['']])
+    faces = faces[~ignored[mesh.texture_ids[faces]]]
+
+    starts = mesh.face_offsets[faces]
+    counts = mesh.face_offsets[faces + 1] - starts
+    starts = starts[counts > 0]
+    counts = counts[counts > 0]
+
+    # Draw back to front by the depth of each face's first vertex
+    order = numpy.argsort(mesh.vertexes[mesh.edges[starts, 0], axis], kind='stable')
+    starts = starts[order]
+    counts = counts[order]
+
+    # Gather the vertexes of every face into one array
+    offsets = numpy.cumsum(counts)
+    corners = numpy.repeat(starts - (offsets - counts), counts) + numpy.arange(offsets[-1] if len(offsets) else 0)
+    points = mesh.vertexes[mesh.edges[corners, 0]][:, drawing_axes].astype(numpy.float64)
+
+    drawing_min_x, drawing_min_y = points.min(axis=0).tolist()
+    drawing_max_x, drawing_max_y = points.max(axis=0).tolist()
+    points[:, 1] = drawing_max_y - points[:, 1] + drawing_min_y
+
+    polygons = [p.tolist() for p in numpy.split(points, offsets[:-1])]
+
+    return polygons, (drawing_min_x, drawing_max_x, drawing_min_y, drawing_max_y)
+
+
+def convert(bsp_file, svg_file, args):
+    """Renders the given bsp file to an svg file.
+
+    Args:
+        bsp_file: A file path to the bsp file to read, or a member path of
+            the form archive.pak:maps/e1m1.bsp.
+
+        svg_file: A file path to the svg file to write.
+
+        args: An argsparse args object with additional arguments.
+    """
+    print(f'Reading {os.path.basename(bsp_file)}')
+
+    with open_member_path(bsp_file) as file:
+        if numpy is not None:
+            polygons, bounds = _array_polygons(file, args)
+
+        else:
+            polygons, bounds = _object_polygons(file, args)
+
+    drawing_min_x, drawing_max_x, drawing_min_y, drawing_max_y = bounds
+
     width = drawing_max_x - drawing_min_x
     height = drawing_max_y - drawing_min_y
     padding = min(width // 10, height // 10)
@@ -73,25 +160,7 @@ def convert(bsp_file, svg_file, args):
     group = dwg.g(id='bsp_ref')
     dwg.defs.add(group)
     
-    if projection_axis == 'x':
-        faces.sort(key=lambda f: f.vertexes[0].x)
-    elif projection_axis == 'y':
-        faces.sort(key=lambda f: f.vertexes[0].y)
-    elif projection_axis == 'z':
-        faces.sort(key=lambda f: f.vertexes[0].z)
-    
-    def vs_picker(vertexes):
-        if projection_axis == 'x':
-            return vertexes[1:3]
-        elif projection_axis == 'y':
-            return vertexes[0], vertexes[2]
-        elif projection_axis == 'z':
-            return vertexes[:2]
-
-    for face in IncrementalBar('Converting', suffix='%(index)d/%(max)d [%(elapsed_td)s / %(eta_td)s]').iter(faces):
-        # Process the vertices into points
-        points = [vs_picker(v) for v in face.vertexes]
-        points = list(map(lambda p: (p[0], drawing_max_y - p[1] + drawing_min_y), points))
+    for points in IncrementalBar('Converting', suffix='%(index)d/%(max)d [%(elapsed_td)s / %(eta_td)s]').iter(polygons):
         points = [tuple(map(simplify_number, p)) for p in points]
 
         # Draw the polygon
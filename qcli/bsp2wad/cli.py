@@ -6,22 +6,90 @@ Supported Games:
 
 
 import argparse
+import contextlib
 import io
+import multiprocessing
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from vgio.quake import bsp, wad
+from vgio.quake import bsp, pak, wad
 
 import qcli
-from qcli.common import Parser, ResolvePathAction, read_from_stdin
+from qcli.archive import expand_member_paths, open_member_path, split_member_path
+from qcli.bsp import MappedBsp
+from qcli.bsp2wad import textures
+from qcli.common import Parser, ResolvePathAction, peek, read_from_stdin
+
+
+def bsp_files(paths):
+    """Expands directories in the given paths to the bsp files they contain.
+
+    Args:
+        paths: An iterable of file or directory paths.
+
+    Yields:
+        File paths. Files found in a directory are yielded in sorted order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+
+            for file in sorted(files):
+                if file.lower().endswith('.bsp') and not file.startswith('.'):
+                    yield os.path.join(root, file)
+
+
+def load(file):
+    """Reads and hashes the miptextures of a bsp file.
+
+    Args:
+        file: A path to the bsp file, or a member path of the form
+            archive.pak:maps/e1m1.bsp.
+
+    Returns:
+        A tuple of a list of (data, digest) tuples and the time taken in
+        seconds. None if the file isn't a bsp file, or the raised exception
+        if it can't be read.
+    """
+    start = time.perf_counter()
+
+    try:
+        with open_member_path(file) as source:
+            if not bsp.is_bspfile(source):
+                return None
+
+            # Only the miptextures lump is read
+            with MappedBsp(source) as bsp_file:
+                result = [(data, textures.digest(data)) for data in bsp_file.miptexture_data() if data]
+
+    except (OSError, pak.BadPakFile):
+        return None
+
+    except Exception as e:
+        return e
+
+    return result, time.perf_counter() - start
 
 
 def main():
+    # Support worker processes in frozen packages
+    multiprocessing.freeze_support()
+
     parser = Parser(
         prog='bsp2wad',
         description='Default action is to create a wad archive from '
                     'miptextures extracted from the given bsp file.'
-                    '\nIf list is omitted, pak will use stdin.',
+                    '\nDirectories in list are searched for bsp files, and '
+                    'bsp files in a pak file can be given as '
+                    'file.pak:maps/e1m1.bsp or as a glob pattern like '
+                    '\'file.pak:maps/*.bsp\'. If list is omitted, pak will '
+                    'use stdin.',
         epilog='example: bsp2wad e1m1.bsp => creates the wad file e1m1.wad'
     )
 
@@ -29,7 +97,7 @@ def main():
         'list',
         nargs='*',
         action=ResolvePathAction,
-        default=read_from_stdin()
+        default=[]
     )
 
     parser.add_argument(
@@ -41,6 +109,31 @@ def main():
         help='wad file to create'
     )
 
+    parser.add_argument(
+        '--rename-variants',
+        dest='rename_variants',
+        action='store_true',
+        help='keep textures that share a name with an earlier texture but '
+             'differ in content, renamed to name_1, name_2, ...'
+    )
+
+    parser.add_argument(
+        '-0', '--null',
+        dest='null',
+        action='store_true',
+        help='items read from stdin are separated by NUL characters, as '
+             'produced by find -print0'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='read N bsp files at a time'
+    )
+
     parser.add_argument(
         '-q',
         dest='quiet',
@@ -59,24 +152,64 @@ def main():
     args = parser.parse_args()
 
     if not args.list:
+        args.list = map(os.path.expanduser, read_from_stdin(args.null))
+
+    first, args.list = peek(args.list)
+
+    if first is None:
         parser.error('the following arguments are required: list')
 
-    miptextures = []
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
 
-    for file in args.list:
-        if not bsp.is_bspfile(file):
-            print('{0}: cannot find or open {1}'.format(parser.prog, file),
-                  file=sys.stderr)
-            continue
+    registry = textures.TextureRegistry(args.rename_variants)
+    timings = []
+    count = 0
+
+    with contextlib.ExitStack() as stack:
+        if args.jobs > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs))
+            files = list(bsp_files(expand_member_paths(args.list)))
+            results = zip(files, executor.map(load, files))
+
+        else:
+            results = ((file, load(file)) for file in bsp_files(expand_member_paths(args.list)))
+
+        # Textures are merged in input order regardless of when their map
+        # finishes loading, so the wad is the same for any number of jobs
+        for file, result in results:
+            count += 1
+
+            if result is None:
+                print('{0}: cannot find or open {1}'.format(parser.prog, file),
+                      file=sys.stderr)
+                continue
+
+            if isinstance(result, Exception):
+                print(f'{parser.prog}: error: {file}: {result}', file=sys.stderr)
+                continue
+
+            map_textures, seconds = result
+            timings.append((file, len(map_textures), seconds))
+
+            for data, digest in map_textures:
+                registry.add(data, file, digest)
+
+    if not count:
+        parser.error('no bsp files found')
 
-        bsp_file = bsp.Bsp.open(file)
-        miptextures += [mip for mip in bsp_file.miptextures if mip and mip.name not in [n.name for n in miptextures]]
+    for original, source, texture in registry.collisions:
+        action = f'renamed to {texture.name}' if texture else 'skipped'
+        print(f'{parser.prog}: warning: {original.name} in {source} differs from '
+              f'{original.name} in {original.sources[0]}, {action}', file=sys.stderr)
 
     if args.dest == os.getcwd():
-        wad_path = os.path.dirname(file)
+        # Maps read from a pak file are named after the member
+        archive, name = split_member_path(file)
+        wad_path = os.path.dirname(archive)
 
-        if len(args.list) == 1:
-            wad_name = f'{os.path.basename(file).split(".")[0]}.wad'
+        if count == 1:
+            wad_name = f'{os.path.basename(name or archive).split(".")[0]}.wad'
 
         else:
             wad_name = 'out.wad'
@@ -91,16 +224,9 @@ def main():
         if not args.quiet:
             print(f'Archive: {os.path.basename(args.dest)}')
 
-        for miptex in miptextures:
-            if not miptex:
-                continue
-
-            buff = io.BytesIO()
-            wad.Miptexture.write(buff, miptex)
-            buff.seek(0)
-
-            info = wad.WadInfo(miptex.name)
-            info.file_size = 40 + len(miptex.pixels)
+        for texture in registry.textures:
+            info = wad.WadInfo(texture.name)
+            info.file_size = len(texture.data)
             info.disk_size = info.file_size
             info.compression = wad.CompressionType.NONE
             info.type = wad.LumpType.MIPTEX
@@ -108,7 +234,18 @@ def main():
             if not args.quiet:
                 print(f' adding: {info.filename}')
 
-            wad_file.writestr(info, buff)
+            wad_file.writestr(info, io.BytesIO(texture.data))
+
+    if not args.quiet:
+        print(f'{"Time":>10}  {"Textures":>8}  Map')
+
+        for file, texture_count, seconds in timings:
+            print(f'{seconds * 1000:8.1f}ms  {texture_count:8}  {file}')
+
+        shared = sum(1 for t in registry.textures if len(set(t.sources)) > 1)
+        print(f'{len(registry.textures)} textures from {len(timings)} maps: '
+              f'{shared} shared by several maps, '
+              f'{len(registry.textures) - shared} found in one map')
 
     sys.exit(0)
 
@@ -0,0 +1,136 @@
+"""Module for collecting miptextures from several bsp files"""
+
+import struct
+
+from qcli.archive import hasher
+
+
+__all__ = ['Texture', 'TextureRegistry', 'digest']
+
+
+def digest(data):
+    """Computes the content digest of a miptexture, leaving out its name.
+
+    Args:
+        data: The miptexture lump as bytes.
+
+    Returns:
+        A hex digest string.
+    """
+    h = hasher()
+    h.update(data[16:])
+
+    return h.hexdigest()
+
+
+class Texture(object):
+    """A distinct miptexture.
+
+    Attributes:
+        name: The name the texture is written with.
+
+        digest: The content digest of everything but the name.
+
+        data: The miptexture lump as bytes.
+
+        sources: The files the texture was found in.
+    """
+
+    __slots__ = (
+        'name',
+        'digest',
+        'data',
+        'sources'
+    )
+
+    def __init__(self, name, digest, data, sources):
+        self.name = name
+        self.digest = digest
+        self.data = data
+        self.sources = sources
+
+
+class TextureRegistry(object):
+    """Keeps one copy of each distinct miptexture by name and content.
+
+    Textures are indexed by name and by name and content digest, so adding a
+    texture takes constant time no matter how many have been collected.
+
+    Args:
+        rename_variants: If True, a texture that has the same name as an
+            earlier one but different contents is kept under a new name.
+            Otherwise it is dropped.
+
+    Attributes:
+        textures: A list of Texture objects in the order they were first seen.
+
+        collisions: A list of (original, source, texture) tuples, one for
+            each texture dropped or renamed because of a name collision.
+            original is the earlier Texture that kept the name, and texture
+            is the renamed Texture or None if it was dropped.
+    """
+
+    def __init__(self, rename_variants=False):
+        self.rename_variants = rename_variants
+        self.textures = []
+        self.collisions = []
+        self._by_name = {}
+        self._by_content = {}
+
+    def add(self, data, source, content_digest=None):
+        """Adds a miptexture.
+
+        Args:
+            data: The miptexture lump as bytes.
+
+            source: The file the texture was found in.
+
+            content_digest: Optional. The digest() of data, if it was already
+                computed.
+
+        Returns:
+            The Texture the data was added as. None if it was dropped.
+        """
+        name = data[:16].split(b'\x00')[0].decode('ascii')
+
+        if content_digest is None:
+            content_digest = digest(data)
+
+        key = name, content_digest
+        texture = self._by_content.get(key)
+
+        if texture:
+            texture.sources.append(source)
+            return texture
+
+        original = self._by_name.get(name)
+
+        if original:
+            if not self.rename_variants:
+                self.collisions.append((original, source, None))
+                return None
+
+            name = self._variant_name(name)
+            data = struct.pack('<16s', name.encode('ascii')) + data[16:]
+
+        texture = Texture(name, content_digest, data, [source])
+        self.textures.append(texture)
+        self._by_name[name] = texture
+        self._by_content[key] = texture
+        self._by_content[name, content_digest] = texture
+
+        if original:
+            self.collisions.append((original, source, texture))
+
+        return texture
+
+    def _variant_name(self, name):
+        # Names are limited to 15 characters
+        for number in range(1, 1000):
+            suffix = f'_{number}'
+            variant = name[:15 - len(suffix)] + suffix
+
+            if variant not in self._by_name:
+                return variant
+
+        raise ValueError(f'too many variants of {name}')
@@ -0,0 +1,159 @@
+"""Module for caching converted data between runs
+
+Entries are files named by a key computed from everything the data was built
+from, so an entry never needs to be invalidated. The cache is kept bounded by
+removing the least recently used entries.
+"""
+
+import os
+import time
+
+from qcli.archive import hasher
+from qcli.common import cache_directory
+
+
+__all__ = ['Cache']
+
+# Default bounds on the total size and the age of unused entries
+MAX_SIZE = 256 * 1024 * 1024
+MAX_AGE = 30 * 24 * 60 * 60
+
+
+class Cache(object):
+    """A directory of cached data.
+
+    Example:
+        Basic usage::
+
+            cache = Cache('lumps')
+            key = cache.key('MIPTEX', file_digest('brick.png'))
+            data = cache.get(key)
+
+            if data is None:
+                data = convert('brick.png')
+                cache.put(key, data)
+
+            cache.trim()
+
+    Args:
+        name: The name of the cache. Entries are kept in a directory with this
+            name in the user cache directory.
+
+        max_size: Optional. The size in bytes trim() reduces the cache to.
+
+        max_age: Optional. The number of seconds an entry is kept after it was
+            last used.
+
+    Attributes:
+        directory: The path to the cache directory.
+    """
+
+    def __init__(self, name, max_size=MAX_SIZE, max_age=MAX_AGE):
+        self.directory = os.path.join(cache_directory(), name)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @staticmethod
+    def key(*parts):
+        """Computes a key from the given strings, numbers and booleans.
+
+        Returns:
+            A hex digest string.
+        """
+        h = hasher()
+        h.update(repr(parts).encode('utf-8'))
+
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Reads the data stored for the given key. The entry is marked as
+        recently used.
+
+        Args:
+            key: A key returned by key().
+
+        Returns:
+            The data as bytes. None if there is no entry for the key.
+        """
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+
+            os.utime(path)
+
+        except OSError:
+            return None
+
+        return data
+
+    def put(self, key, data):
+        """Stores data for the given key. The entry is written atomically, and
+        failing to write it is not an error.
+
+        Args:
+            key: A key returned by key().
+
+            data: The bytes to store.
+        """
+        path = self._path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+
+            os.replace(temp_path, path)
+
+        except OSError:
+            try:
+                os.remove(temp_path)
+
+            except OSError:
+                pass
+
+    def trim(self):
+        """Removes entries that haven't been used within max_age seconds, then
+        the least recently used entries until the cache fits in max_size
+        bytes.
+
+        Returns:
+            The number of bytes removed.
+        """
+        entries = []
+
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+
+                try:
+                    stat = os.stat(path)
+
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        expired = time.time() - self.max_age
+        removed = 0
+
+        for mtime, size, path in entries:
+            if total - removed <= self.max_size and mtime >= expired:
+                break
+
+            try:
+                os.remove(path)
+                removed += size
+
+            except OSError:
+                pass
+
+        return removed
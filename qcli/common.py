@@ -1,4 +1,7 @@
 import argparse
+import csv
+import itertools
+import json
 import os
 import sys
 import re
@@ -6,18 +9,105 @@ import re
 ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
 
 
-def read_from_stdin():
-    """Reads and sanitizes input from stdin
+def read_from_stdin(null_delimited=False):
+    """Lazily reads and sanitizes input from stdin. Nothing is read until the
+    result is iterated.
+
+    Args:
+        null_delimited: If True, items are separated by NUL characters as
+            produced by find -print0. Otherwise items are separated by
+            newlines and stripped of ANSI escape sequences.
+
+    Yields:
+        Strings
+    """
+    if sys.stdin is None or sys.stdin.isatty():
+        return
+
+    if null_delimited:
+        remainder = b''
+
+        for chunk in iter(lambda: sys.stdin.buffer.read(64 * 1024), b''):
+            *items, remainder = (remainder + chunk).split(b'\0')
+
+            for item in items:
+                if item:
+                    yield os.fsdecode(item)
+
+        if remainder:
+            yield os.fsdecode(remainder)
+
+        return
+
+    for line in sys.stdin:
+        line = ansi_escape.sub('', line.strip('\n'))
+
+        if line:
+            yield line
+
+
+def peek(iterable):
+    """Returns the first item of an iterable without consuming it.
+
+    Args:
+        iterable: Any iterable.
+
+    Returns:
+        A tuple of the first item, or None if the iterable is empty, and an
+        iterator over all of the items.
+    """
+    iterator = iter(iterable)
+    first = next(iterator, None)
+
+    if first is None:
+        return None, iterator
+
+    return first, itertools.chain([first], iterator)
+
+
+def cache_directory():
+    """Returns the directory where data that is expensive to compute can be
+    cached between runs. The directory isn't created.
 
     Returns:
-        A list of strings
+        A directory path.
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+
+    return os.path.join(base, 'quake-cli-tools')
+
+
+def write_rows(rows, fields, format, file=None):
+    """Writes rows in a machine readable format as they are produced.
+
+    Args:
+        rows: An iterable of row sequences.
+
+        fields: A sequence of field names.
+
+        format: One of 'ndjson', 'csv' or 'tsv'.
+
+        file: Optional. A text file-like object. Defaults to stdout.
     """
-    if not sys.stdin.isatty():
-        stdin = [t.strip('\n') for t in sys.stdin]
-        stdin = [ansi_escape.sub('', t) for t in stdin]
-        stdin = [t for t in stdin if t]
+    file = file or sys.stdout
+
+    if format == 'ndjson':
+        for row in rows:
+            file.write(json.dumps(dict(zip(fields, row))) + '\n')
+
+        return
 
-        return stdin
+    delimiter = '\t' if format == 'tsv' else ','
+    writer = csv.writer(file, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(fields)
+    writer.writerows(rows)
 
 
 class ResolvePathAction(argparse.Action):
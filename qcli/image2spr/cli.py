@@ -9,14 +9,16 @@ import os
 import struct
 import sys
 
-import vgio
 from PIL import Image
 from vgio.quake import spr
 
 import qcli
+from qcli.archive import file_digest
+from qcli.cache import Cache
 from qcli.common import Parser
 from qcli.common import ResolvePathAction
 from qcli.common import read_from_stdin
+from qcli.palette import palette, quantize, quantizer
 
 
 def main():
@@ -40,7 +42,7 @@ def main():
         nargs='*',
         metavar='file.gif',
         action=ResolvePathAction,
-        default=read_from_stdin(),
+        default=[],
         help='image source file'
     )
 
@@ -51,6 +53,30 @@ def main():
         help='sprite orientation type'
     )
 
+    parser.add_argument(
+        '--compatible',
+        dest='compatible',
+        action='store_true',
+        help='quantize colors with dithering, matching earlier versions '
+             'byte for byte'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='always convert images instead of reusing frames converted by '
+             'earlier runs'
+    )
+
+    parser.add_argument(
+        '-0', '--null',
+        dest='null',
+        action='store_true',
+        help='items read from stdin are separated by NUL characters, as '
+             'produced by find -print0'
+    )
+
     parser.add_argument(
         '-q',
         dest='quiet',
@@ -68,14 +94,11 @@ def main():
 
     args = parser.parse_args()
 
-    # Flatten out palette
-    quake_palette = [channel for rgb in vgio.quake.palette for channel in rgb]
-
-    # Create palette image for Image.quantize()
-    quake_palette_image = Image.frombytes('P', (16, 16), bytes(quake_palette))
-    quake_palette_image.putpalette(quake_palette)
+    if not args.source_files:
+        args.source_files = map(os.path.expanduser, read_from_stdin(args.null))
 
     images = []
+    cache = None if args.no_cache else Cache('frames')
 
     # Build a list of source images
     for source_file in args.source_files:
@@ -83,6 +106,27 @@ def main():
             print(f'{parser.prog}: cannot find or open {source_file}', file=sys.stderr)
             continue
 
+        # Reuse frames converted from the same file contents
+        if cache:
+            key = cache.key(qcli.__version__, quantizer(args.compatible), file_digest(source_file))
+            cached = cache.get(key)
+
+            if cached is not None:
+                width, height, count = struct.unpack_from('<3I', cached)
+                size = width, height
+                offset = struct.calcsize('<3I')
+
+                for _ in range(count):
+                    frame_image = Image.frombytes('P', size, cached[offset:offset + width * height])
+                    frame_image.info['transparency'] = 255
+                    frame_image.putpalette(palette)
+                    images.append(frame_image)
+                    offset += width * height
+
+                continue
+
+        first_frame = len(images)
+
         # Open source image
         source_image = Image.open(source_file)
         size = source_image.size
@@ -99,12 +143,12 @@ def main():
                     source_image = source_image.convert('RGB')
 
                     mask = Image.eval(alpha, lambda a: 255 if a <=128 else 0)
-                    transparent_color = tuple(quake_palette[-3:])
+                    transparent_color = tuple(palette[-3:])
                     source_image.paste(transparent_color, mask)
                     source_image.info['transparency'] = 255
 
-                    source_image = source_image.quantize(palette=quake_palette_image)
-                    source_image.putpalette(bytes(quake_palette))
+                    source_image = quantize(source_image, args.compatible)
+                    source_image.putpalette(palette)
 
                 # Set the current palette's transparent color to Quake's
                 local_transparency = source_image.info.get('transparency')
@@ -112,10 +156,10 @@ def main():
                 source_palette = list(struct.unpack(f'{len(source_palette)}B', source_palette))
 
                 if local_transparency:
-                    source_palette[local_transparency * 3:local_transparency * 3 + 3] = vgio.quake.palette[-1]
+                    source_palette[local_transparency * 3:local_transparency * 3 + 3] = palette[-3:]
 
                 if global_transparency and global_transparency != local_transparency:
-                    source_palette[global_transparency * 3:global_transparency * 3 + 3] = vgio.quake.palette[-1]
+                    source_palette[global_transparency * 3:global_transparency * 3 + 3] = palette[-3:]
 
                 source_palette = bytes(source_palette)
 
@@ -130,15 +174,23 @@ def main():
 
                 # Convert from indexed color to RGB color then quantize to Quake's palette
                 sub_image = sub_image.convert('RGB', dither=None)
-                sub_image = sub_image.quantize(palette=quake_palette_image)
+                sub_image = quantize(sub_image, args.compatible)
                 sub_image.info['transparency'] = 255
-                sub_image.putpalette(bytes(quake_palette))
+                sub_image.putpalette(palette)
                 images.append(sub_image)
                 source_image.seek(source_image.tell() + 1)
 
         except EOFError:
             pass
 
+        if cache:
+            frames = images[first_frame:]
+            data = struct.pack('<3I', *size, len(frames)) + b''.join(f.tobytes() for f in frames)
+            cache.put(key, data)
+
+    if cache:
+        cache.trim()
+
     if not images:
         print(f'{parser.prog}: no usable source images given', file=sys.stderr)
         sys.exit(1)
@@ -156,7 +208,7 @@ def main():
 
             for image in images:
                 resized_image = Image.new('P', (max_width, max_height), 255)
-                resized_image.putpalette(bytes(quake_palette))
+                resized_image.putpalette(palette)
 
                 top = (max_height - image.size[1]) // 2
                 left = (max_width - image.size[0]) // 2
@@ -6,21 +6,30 @@ Supported Games:
 
 
 import argparse
+import contextlib
 import os
 import sys
+import tarfile
+import zipfile
 
 from vgio.quake import pak
 
 import qcli
-from qcli.common import Parser, ResolvePathAction, read_from_stdin
+from qcli.archive import file_digest, reachable, write_stream
+from qcli.common import Parser, ResolvePathAction, peek, read_from_stdin
+from qcli.pak.compact import compact
+from qcli.pak.layout import read_trace, sorted_key, trace_key
+from qcli.pak.manifest import manifest_path, read_manifest, write_manifest
+from qcli.pak.sources import walk
 
 
 def main():
     parser = Parser(
         prog='pak',
         description='Default action is to add or replace pak files '
-                    'entries from list.\nIf list is omitted, pak will '
-                    'use stdin.',
+                    'entries from list. Zip and tar files in list add their '
+                    'members, and - reads a tar stream from stdin.\nIf list '
+                    'is omitted, pak will use stdin.',
         epilog='example: pak tex.pak image.png => adds image.png to tex.pak'
     )
 
@@ -35,7 +44,47 @@ def main():
         'list',
         nargs='*',
         action=ResolvePathAction,
-        default=read_from_stdin()
+        default=[]
+    )
+
+    parser.add_argument(
+        '--compact',
+        dest='compact',
+        action='store_true',
+        help='rewrite the archive without replaced or unreachable data'
+    )
+
+    layout_group = parser.add_mutually_exclusive_group()
+
+    layout_group.add_argument(
+        '--layout',
+        dest='layout',
+        choices=['sorted'],
+        help='write entries sorted by name'
+    )
+
+    layout_group.add_argument(
+        '--layout-from',
+        metavar='trace.txt',
+        dest='layout_from',
+        action=ResolvePathAction,
+        help='write entries in the order they are listed in trace.txt, '
+             'an engine "developer 1" log or a list of names'
+    )
+
+    parser.add_argument(
+        '-u',
+        dest='update',
+        action='store_true',
+        help='only add new or changed files'
+    )
+
+    parser.add_argument(
+        '-0', '--null',
+        dest='null',
+        action='store_true',
+        help='items read from stdin are separated by NUL characters, as '
+             'produced by find -print0'
     )
 
     parser.add_argument(
@@ -55,9 +104,45 @@ def main():
 
     args = parser.parse_args()
 
+    key = None
+
+    if args.layout_from:
+        try:
+            key = trace_key(read_trace(args.layout_from))
+
+        except OSError:
+            print(f'{parser.prog}: cannot find or open {args.layout_from}', file=sys.stderr)
+            sys.exit(1)
+
+    elif args.layout == 'sorted':
+        key = sorted_key
+
     if not args.list:
+        args.list = map(os.path.expanduser, read_from_stdin(args.null))
+
+    first, args.list = peek(args.list)
+
+    if args.compact and first is None:
+        if not pak.is_pakfile(args.file):
+            print(f'{parser.prog}: cannot find or open {args.file}', file=sys.stderr)
+            sys.exit(1)
+
+        reclaimed = compact(args.file, key)
+
+        if not args.quiet:
+            print(f'Compacted {os.path.basename(args.file)}: {reclaimed} bytes reclaimed')
+
+        sys.exit(0)
+
+    if first is None:
         parser.error('the following arguments are required: list')
 
+    if key:
+        args.list = list(args.list)
+
+        if '-' in args.list:
+            parser.error('a tar stream from stdin can not be reordered with --layout or --layout-from')
+
     dir = os.path.dirname(args.file) or '.'
     if not os.path.exists(dir):
         os.makedirs(dir)
@@ -66,31 +151,89 @@ def main():
     if not os.path.isfile(args.file):
         filemode = 'w'
 
+    # The manifest is kept up to date once it has been created with -u
+    manifest_file = manifest_path(args.file)
+    use_manifest = args.update or os.path.isfile(manifest_file)
+    manifest = {}
+
+    if use_manifest and filemode == 'a':
+        manifest = read_manifest(manifest_file)
+
     with pak.PakFile(args.file, filemode) as pak_file:
         if not args.quiet:
             print(f'Archive: {os.path.basename(args.file)}')
 
-        # Process input files
-        for file in args.list:
-            # Walk directories
-            if os.path.isdir(file):
-                for root, dirs, files in os.walk(file):
-                    for name in [f for f in files if not f.startswith('.')]:
-                        fullpath = os.path.join(root, name)
-                        relpath = os.path.relpath(fullpath, os.getcwd())
+        # Forget records that don't match what is in the archive
+        for name in list(manifest):
+            info = pak_file.NameToInfo.get(name)
+
+            if info is None or info.file_size != manifest[name].get('size'):
+                del manifest[name]
+
+        def add(source):
+            record = manifest.get(source.name)
+
+            # Skip unchanged files
+            if args.update and record and record['size'] == source.size:
+                if record['mtime'] == source.mtime:
+                    return
+
+                if source.path and record['digest'] == file_digest(source.path):
+                    record['mtime'] = source.mtime
+                    return
 
-                        if not args.quiet:
-                            print(f'  adding: {relpath}')
+            if len(source.name) > 56:
+                raise pak.BadPakFile('PakFile filename must be 56 characters or less')
 
-                        pak_file.write(relpath)
+            if not args.quiet:
+                if source.name in pak_file.NameToInfo:
+                    print(f'  updating: {source.name}')
 
-            else:
-                relpath = os.path.relpath(file, os.getcwd())
+                else:
+                    print(f'  adding: {source.name}')
 
-                if not args.quiet:
-                    print(f'  adding: {relpath}')
+            info = pak.PakInfo(source.name)
 
-                pak_file.write(relpath)
+            with source.open() as file:
+                digest = write_stream(pak_file, info, file)
+
+            manifest[source.name] = {
+                'size': info.file_size,
+                'mtime': source.mtime,
+                'digest': digest
+            }
+
+        errors = False
+
+        with contextlib.ExitStack() as stack:
+            sources = walk(args.list, stack)
+
+            if key:
+                sources = sorted(sources, key=lambda s: key(s.name))
+
+            # Process input files
+            try:
+                for source in sources:
+                    add(source)
+
+            except (tarfile.TarError, zipfile.BadZipFile) as e:
+                print(f'{parser.prog}: error: {e}', file=sys.stderr)
+                errors = True
+
+        # Replaced entries stay in the directory list, only keep the latest
+        pak_file.file_list[:] = reachable(pak_file.file_list, pak_file.NameToInfo)
+
+    if use_manifest:
+        write_manifest(manifest_file, manifest)
+
+    if errors:
+        sys.exit(1)
+
+    if args.compact:
+        reclaimed = compact(args.file, key)
+
+        if not args.quiet:
+            print(f'Compacted {os.path.basename(args.file)}: {reclaimed} bytes reclaimed')
 
     sys.exit(0)
 
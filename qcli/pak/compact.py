@@ -0,0 +1,61 @@
+"""Module for compacting pak files
+
+Replacing entries in a pak file leaves the old data behind in the file.
+Compacting rewrites the archive with only the latest entry for each name.
+"""
+
+import os
+import shutil
+
+from vgio.quake import pak
+
+from qcli.archive import MappedArchive, reachable
+
+
+__all__ = ['compact']
+
+
+def compact(filename, key=None):
+    """Rewrites the given pak file without unreachable data or duplicate
+    entries. When an entry name occurs more than once the last one wins.
+
+    The archive is written to a temporary file in a single pass and then
+    atomically renamed over the original.
+
+    Args:
+        filename: A path to the pak file.
+
+        key: Optional. A key function that takes an entry name. If given
+            entries are written in sorted order.
+
+    Returns:
+        The number of bytes reclaimed.
+    """
+    temp_filename = f'{filename}.tmp'
+    old_size = os.path.getsize(filename)
+
+    with pak.PakFile(filename) as pak_file:
+        info_list = reachable(pak_file.infolist(), pak_file.NameToInfo)
+
+    if key:
+        info_list.sort(key=lambda i: key(i.filename))
+
+    try:
+        with MappedArchive(filename) as archive, pak.PakFile(temp_filename, 'w') as out_file:
+            for info in info_list:
+                out_info = pak.PakInfo(info.filename)
+                out_info.file_offset = out_file.fp.tell()
+
+                with archive.view(info) as view, out_file.open(out_info, 'w') as dest:
+                    dest.write(view)
+
+        shutil.copymode(filename, temp_filename)
+        os.replace(temp_filename, filename)
+
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+
+        raise
+
+    return old_size - os.path.getsize(filename)
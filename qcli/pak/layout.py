@@ -0,0 +1,93 @@
+"""Module for ordering pak file entries
+
+The order of entries in a pak file determines where their data lives on
+disk. Laying entries out in the order an engine first reads them improves
+read locality on slow storage.
+"""
+
+import re
+
+from qcli.common import ansi_escape
+
+
+__all__ = ['read_trace', 'sorted_key', 'trace_key']
+
+# Lines logged by the engine with "developer 1" when a file is opened. Files
+# that weren't found are logged as "FindFile: can't find name"
+pack_file_pattern = re.compile(r'PackFile:\s.*\s:\s(?P<name>\S+)')
+find_file_pattern = re.compile(r"FindFile:\s(?!can't find\s)(?P<name>\S+)")
+
+
+def read_trace(filename):
+    """Reads a list of file names in first access order. The file can either
+    be an engine log captured with "developer 1" or a plain list with one
+    name per line.
+
+    Args:
+        filename: A path to the trace file.
+
+    Returns:
+        A list of file names with duplicates removed.
+    """
+    names = {}
+
+    with open(filename, errors='replace') as file:
+        for line in file:
+            line = ansi_escape.sub('', line).strip()
+
+            match = pack_file_pattern.search(line) or find_file_pattern.search(line)
+            if match:
+                line = match.group('name')
+
+            elif ' ' in line:
+                continue
+
+            if line:
+                names.setdefault(line.replace('\\', '/'), None)
+
+    return list(names)
+
+
+def sorted_key(name):
+    """Key function for a reproducible layout sorted by name."""
+    return name
+
+
+def trace_key(names):
+    """Returns a key function that orders entries by the given access trace.
+    Names are matched exactly or by a trailing path, so 'id1/maps/e1m1.bsp'
+    in a trace matches the entry 'maps/e1m1.bsp' and vice versa. Entries
+    that are not in the trace sort after those that are.
+
+    Args:
+        names: A sequence of file names in first access order.
+
+    Returns:
+        A key function that takes an entry name.
+    """
+    ranks = {}
+
+    for rank, name in enumerate(names):
+        for suffix in _suffixes(name):
+            ranks.setdefault(suffix, rank)
+
+    def key(name):
+        for suffix in _suffixes(name):
+            if suffix in ranks:
+                return ranks[suffix]
+
+        return len(names)
+
+    return key
+
+
+def _suffixes(name):
+    """Yields the name and its trailing paths that contain a directory,
+    longest first."""
+    name = name.replace('\\', '/').lstrip('./')
+    parts = name.split('/')
+
+    yield name
+
+    for i in range(1, len(parts) - 1):
+        yield '/'.join(parts[i:])
@@ -0,0 +1,66 @@
+"""Module for reading and writing pak manifest files
+
+A manifest is a JSON sidecar file that records the size, modification time
+and content digest of every file added to a pak file. It is used to skip
+files that have not changed since they were last added.
+"""
+
+import json
+import os
+
+
+__all__ = ['manifest_path', 'read_manifest', 'write_manifest']
+
+VERSION = 1
+
+
+def manifest_path(filename):
+    """Returns the manifest path for the given pak file.
+
+    Args:
+        filename: A path to a pak file.
+
+    Returns:
+        A file path.
+    """
+    return f'{filename}.manifest'
+
+
+def read_manifest(filename):
+    """Reads a manifest file.
+
+    Args:
+        filename: A path to the manifest file.
+
+    Returns:
+        A dictionary mapping entry names to records. Each record is a
+        dictionary with 'size', 'mtime' and 'digest' keys. An empty dictionary
+        is returned if the manifest is missing or unreadable.
+    """
+    try:
+        with open(filename) as file:
+            manifest = json.load(file)
+
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(manifest, dict) or manifest.get('version') != VERSION:
+        return {}
+
+    return manifest.get('entries', {})
+
+
+def write_manifest(filename, entries):
+    """Writes a manifest file. The file is replaced atomically.
+
+    Args:
+        filename: A path to the manifest file.
+
+        entries: A dictionary mapping entry names to records.
+    """
+    temp_filename = f'{filename}.tmp'
+
+    with open(temp_filename, 'w') as file:
+        json.dump({'version': VERSION, 'entries': entries}, file, indent=1, sort_keys=True)
+
+    os.replace(temp_filename, filename)
@@ -0,0 +1,181 @@
+"""Module for creating and applying pak file patches
+
+A patch is itself a pak file. Its entries are the contents that are new in
+the target archive, each stored once under its content digest, plus a
+PATCH_NAME entry that lists every file of the target archive in order along
+with its digest and size. Contents that already exist in the base archive
+are copied from it when the patch is applied.
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from vgio.quake import pak
+
+from qcli.archive import MappedArchive, reachable
+
+
+__all__ = ['PATCH_NAME', 'BadPatchFile', 'diff', 'apply']
+
+PATCH_NAME = 'pakpatch.json'
+VERSION = 1
+
+
+class BadPatchFile(Exception):
+    pass
+
+
+def _digests(archive, info_list, jobs):
+    """Hashes the given entries in parallel straight from the mapped archive"""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(archive.digest, info_list))
+
+
+def _write(out_file, name, view):
+    info = pak.PakInfo(name)
+    info.file_offset = out_file.fp.tell()
+
+    with out_file.open(info, 'w') as dest:
+        dest.write(view)
+
+
+def diff(old_filename, new_filename, patch_filename, jobs=None):
+    """Creates a patch that turns the old pak file into the new one.
+
+    Args:
+        old_filename: A path to the base pak file.
+
+        new_filename: A path to the target pak file.
+
+        patch_filename: A path to the patch file to create.
+
+        jobs: Optional. The number of entries to hash at a time.
+
+    Returns:
+        A dictionary with 'added', 'changed', 'removed' and 'unchanged' lists
+        of entry names.
+    """
+    with pak.PakFile(old_filename) as old_file:
+        old_list = reachable(old_file.infolist(), old_file.NameToInfo)
+
+    with pak.PakFile(new_filename) as new_file:
+        new_list = reachable(new_file.infolist(), new_file.NameToInfo)
+
+    result = {'added': [], 'changed': [], 'removed': [], 'unchanged': []}
+
+    with MappedArchive(old_filename) as old_archive, MappedArchive(new_filename) as new_archive:
+        old_digests = dict(zip([i.filename for i in old_list], _digests(old_archive, old_list, jobs)))
+        new_digests = _digests(new_archive, new_list, jobs)
+        known = set(old_digests.values())
+
+        entries = []
+
+        with pak.PakFile(patch_filename, 'w') as patch_file:
+            for info, digest in zip(new_list, new_digests):
+                entries.append([info.filename, digest, info.file_size])
+
+                if info.filename not in old_digests:
+                    result['added'].append(info.filename)
+
+                elif old_digests[info.filename] != digest:
+                    result['changed'].append(info.filename)
+
+                else:
+                    result['unchanged'].append(info.filename)
+
+                # Store each new content only once
+                if digest not in known:
+                    known.add(digest)
+
+                    with new_archive.view(info) as view:
+                        _write(patch_file, digest, view)
+
+            new_names = {i.filename for i in new_list}
+            result['removed'] = [name for name in old_digests if name not in new_names]
+
+            manifest = {
+                'version': VERSION,
+                'entries': entries,
+                'removed': result['removed']
+            }
+
+            _write(patch_file, PATCH_NAME, json.dumps(manifest).encode('ascii'))
+
+    return result
+
+
+def apply(base_filename, patch_filename, out_filename, jobs=None):
+    """Applies a patch to a pak file. The output is written to a temporary
+    file and then renamed, so out_filename may be the base pak file.
+
+    Args:
+        base_filename: A path to the base pak file.
+
+        patch_filename: A path to the patch file.
+
+        out_filename: A path to the pak file to create.
+
+        jobs: Optional. The number of entries to hash at a time.
+
+    Returns:
+        The list of entry names written.
+
+    Raises:
+        BadPatchFile: If the patch is unreadable or does not apply to the base
+            pak file.
+    """
+    with pak.PakFile(patch_filename) as patch_file:
+        try:
+            manifest = json.loads(patch_file.read(PATCH_NAME))
+
+        except (KeyError, ValueError):
+            raise BadPatchFile(f'{patch_filename} is not a pak patch')
+
+        blobs = dict(patch_file.NameToInfo)
+
+    if manifest.get('version') != VERSION:
+        raise BadPatchFile(f'Unsupported patch version: {manifest.get("version")}')
+
+    with pak.PakFile(base_filename) as base_file:
+        base_list = reachable(base_file.infolist(), base_file.NameToInfo)
+
+    entries = manifest['entries']
+    temp_filename = f'{out_filename}.tmp'
+
+    try:
+        with MappedArchive(base_filename) as base_archive, \
+                MappedArchive(patch_filename) as patch_archive, \
+                pak.PakFile(temp_filename, 'w') as out_file:
+
+            # Only hash base entries that could supply missing contents
+            sizes = {size for name, digest, size in entries if digest not in blobs}
+            candidates = [i for i in base_list if i.file_size in sizes]
+            sources = dict(zip(_digests(base_archive, candidates, jobs), candidates))
+
+            for name, digest, size in entries:
+                if digest in blobs:
+                    archive, info = patch_archive, blobs[digest]
+
+                elif digest in sources:
+                    archive, info = base_archive, sources[digest]
+
+                else:
+                    raise BadPatchFile(f'Patch does not apply, {base_filename} is missing the contents of {name}')
+
+                with archive.view(info) as view:
+                    _write(out_file, name, view)
+
+        if os.path.exists(out_filename):
+            shutil.copymode(out_filename, temp_filename)
+
+        os.replace(temp_filename, out_filename)
+
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+
+        raise
+
+    return [name for name, digest, size in entries]
@@ -0,0 +1,126 @@
+"""Module for enumerating the files to add to a pak file
+
+Files can come from the filesystem, from zip files or from tar files,
+including a tar stream on stdin. Archive members are read straight out of
+their archive without being extracted to disk first.
+"""
+
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+
+__all__ = ['Source', 'walk']
+
+ZIP_EXTENSIONS = ('.zip', '.pk3')
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class Source(object):
+    """A file to be added to a pak file.
+
+    Attributes:
+        name: The entry name in the pak file.
+
+        size: The size of the file in bytes.
+
+        mtime: The modification time in nanoseconds.
+
+        open: A callable that returns a binary file-like object to read the
+            contents from.
+
+        path: The file path if the source is a file on the filesystem,
+            otherwise None.
+    """
+
+    __slots__ = (
+        'name',
+        'size',
+        'mtime',
+        'open',
+        'path'
+    )
+
+    def __init__(self, name, size, mtime, open, path=None):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.open = open
+        self.path = path
+
+
+def _member_name(name):
+    name = name.replace('\\', '/')
+
+    while name.startswith(('/', './')):
+        name = name[2:] if name.startswith('./') else name[1:]
+
+    return name
+
+
+def _file_source(path):
+    relpath = os.path.relpath(path, os.getcwd())
+    stat = os.stat(relpath)
+
+    return Source(relpath, stat.st_size, stat.st_mtime_ns, lambda: open(relpath, 'rb'), relpath)
+
+
+def _zip_sources(zip_file):
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+
+        mtime = int(time.mktime(info.date_time + (0, 0, -1))) * 10 ** 9
+        opener = lambda info=info: zip_file.open(info)
+
+        yield Source(_member_name(info.filename), info.file_size, mtime, opener)
+
+
+def _tar_sources(tar_file):
+    for info in tar_file:
+        if not info.isfile():
+            continue
+
+        opener = lambda info=info: tar_file.extractfile(info)
+
+        yield Source(_member_name(info.name), info.size, int(info.mtime) * 10 ** 9, opener)
+
+
+def walk(paths, stack):
+    """Yields a Source for every file to add. Directories are walked, zip and
+    tar files contribute their members and '-' reads a tar stream from stdin.
+
+    Args:
+        paths: An iterable of paths.
+
+        stack: A contextlib.ExitStack that keeps archives open. Sources must
+            be opened before the stack is closed.
+
+    Yields:
+        Source objects
+    """
+    for path in paths:
+        lower_path = path.lower()
+
+        if path == '-':
+            # Members of a stream must be read in order as they are yielded
+            tar_file = stack.enter_context(tarfile.open(fileobj=sys.stdin.buffer, mode='r|*'))
+            yield from _tar_sources(tar_file)
+
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in [f for f in files if not f.startswith('.')]:
+                    yield _file_source(os.path.join(root, name))
+
+        elif lower_path.endswith(ZIP_EXTENSIONS) and zipfile.is_zipfile(path):
+            zip_file = stack.enter_context(zipfile.ZipFile(path))
+            yield from _zip_sources(zip_file)
+
+        elif lower_path.endswith(TAR_EXTENSIONS) and tarfile.is_tarfile(path):
+            tar_file = stack.enter_context(tarfile.open(path))
+            yield from _tar_sources(tar_file)
+
+        else:
+            yield _file_source(path)
@@ -0,0 +1,102 @@
+"""Command line utility for creating patches between PAK files
+
+Supported Games:
+    - QUAKE
+"""
+
+
+import argparse
+import os
+import sys
+
+from vgio.quake import pak
+
+import qcli
+from qcli.common import Parser, ResolvePathAction
+from qcli.pak.patch import diff
+
+
+def main():
+    parser = Parser(
+        prog='pakdiff',
+        description='Default action is to create a patch containing only the '
+                    'added and changed files of new.pak. Apply it with pakpatch.',
+        epilog='example: pakdiff old.pak new.pak update.pak => creates '
+               'update.pak'
+    )
+
+    parser.add_argument(
+        'old_file',
+        metavar='old.pak',
+        action=ResolvePathAction,
+        help='base pak file'
+    )
+
+    parser.add_argument(
+        'new_file',
+        metavar='new.pak',
+        action=ResolvePathAction,
+        help='target pak file'
+    )
+
+    parser.add_argument(
+        'patch_file',
+        metavar='patch.pak',
+        action=ResolvePathAction,
+        help='patch file to create'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='hash N files at a time [default: number of CPUs]'
+    )
+
+    parser.add_argument(
+        '-q',
+        dest='quiet',
+        action='store_true',
+        help='quiet mode'
+    )
+
+    parser.add_argument(
+        '-v', '--version',
+        dest='version',
+        action='version',
+        help=argparse.SUPPRESS,
+        version=f'{parser.prog} version {qcli.__version__}'
+    )
+
+    args = parser.parse_args()
+
+    for file in [args.old_file, args.new_file]:
+        if not pak.is_pakfile(file):
+            print(f'{parser.prog}: cannot find or open {file}', file=sys.stderr)
+            sys.exit(1)
+
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
+    dir = os.path.dirname(args.patch_file) or '.'
+    os.makedirs(dir, exist_ok=True)
+
+    result = diff(args.old_file, args.new_file, args.patch_file, args.jobs)
+
+    if not args.quiet:
+        print(f'Patch: {os.path.basename(args.patch_file)}')
+
+        for action, key in [('adding', 'added'), ('changing', 'changed'), ('removing', 'removed')]:
+            for name in result[key]:
+                print(f'  {action}: {name}')
+
+        counts = ', '.join(f'{len(result[k])} {k}' for k in ['added', 'changed', 'removed', 'unchanged'])
+        print(f'{counts}, {os.path.getsize(args.patch_file)} bytes')
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Command line utility for applying patches created by pakdiff
+
+Supported Games:
+    - QUAKE
+"""
+
+
+import argparse
+import os
+import sys
+
+from vgio.quake import pak
+
+import qcli
+from qcli.common import Parser, ResolvePathAction
+from qcli.pak.patch import BadPatchFile, apply
+
+
+def main():
+    parser = Parser(
+        prog='pakpatch',
+        description='Default action is to apply the patch to file.pak in '
+                    'place.',
+        epilog='example: pakpatch pak1.pak update.pak => updates pak1.pak'
+    )
+
+    parser.add_argument(
+        'file',
+        metavar='file.pak',
+        action=ResolvePathAction,
+        help='pak file to patch'
+    )
+
+    parser.add_argument(
+        'patch_file',
+        metavar='patch.pak',
+        action=ResolvePathAction,
+        help='patch file created by pakdiff'
+    )
+
+    parser.add_argument(
+        '-o',
+        metavar='out.pak',
+        dest='dest',
+        action=ResolvePathAction,
+        help='write the patched pak file to out.pak instead'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='hash N files at a time [default: number of CPUs]'
+    )
+
+    parser.add_argument(
+        '-q',
+        dest='quiet',
+        action='store_true',
+        help='quiet mode'
+    )
+
+    parser.add_argument(
+        '-v', '--version',
+        dest='version',
+        action='version',
+        help=argparse.SUPPRESS,
+        version=f'{parser.prog} version {qcli.__version__}'
+    )
+
+    args = parser.parse_args()
+
+    for file in [args.file, args.patch_file]:
+        if not pak.is_pakfile(file):
+            print(f'{parser.prog}: cannot find or open {file}', file=sys.stderr)
+            sys.exit(1)
+
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
+    dest = args.dest or args.file
+
+    dir = os.path.dirname(dest) or '.'
+    os.makedirs(dir, exist_ok=True)
+
+    try:
+        names = apply(args.file, args.patch_file, dest, args.jobs)
+
+    except BadPatchFile as e:
+        print(f'{parser.prog}: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    if not args.quiet:
+        print(f'Patched {os.path.basename(dest)}: {len(names)} files')
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
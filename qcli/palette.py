@@ -0,0 +1,158 @@
+"""Module for mapping colors to the Quake palette
+
+Colors are mapped to the nearest palette index with a lookup table covering
+every 24-bit color. The table is built with NumPy the first time it is needed
+and cached on disk. Without NumPy, images are quantized by Pillow instead.
+"""
+
+import functools
+import hashlib
+import os
+
+import PIL
+from PIL import Image
+
+from vgio import quake
+
+from qcli.common import cache_directory
+
+try:
+    import numpy
+
+except ImportError:
+    numpy = None
+
+
+__all__ = ['lookup_table', 'palette', 'palette_image', 'quantize', 'quantizer']
+
+# The flattened Quake palette
+palette = bytes(channel for rgb in quake.palette for channel in rgb)
+
+_palette_digest = hashlib.blake2b(palette, digest_size=8).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def palette_image():
+    """Returns an image carrying the Quake palette for Image.quantize().
+
+    Returns:
+        A 16x16 Image object in P mode.
+    """
+    image = Image.frombytes('P', (16, 16), palette)
+    image.putpalette(palette)
+
+    return image
+
+
+def _build_table():
+    colors = numpy.array(quake.palette, dtype=numpy.int32)
+    table = numpy.empty((256, 256, 256), dtype=numpy.uint8)
+
+    # Squared distances are compared as |c|^2 - 2 p.c, which is exact in
+    # single precision for 8-bit channels
+    weights = (colors ** 2).sum(1).astype(numpy.float32)
+    axis = numpy.arange(16)
+    offsets = numpy.stack(numpy.meshgrid(axis, axis, axis, indexing='ij'), -1).reshape(-1, 3)
+
+    # Only palette entries that can be nearest to some color in a 16x16x16
+    # block are searched for the colors in that block
+    for r in range(0, 256, 16):
+        for g in range(0, 256, 16):
+            for b in range(0, 256, 16):
+                low = numpy.array([r, g, b])
+                high = low + 15
+
+                min_distances = ((colors - numpy.clip(colors, low, high)) ** 2).sum(1)
+                farthest = numpy.where(colors - low > high - colors, low, high)
+                max_distances = ((colors - farthest) ** 2).sum(1)
+                candidates = numpy.flatnonzero(min_distances <= max_distances.min())
+
+                points = (low + offsets).astype(numpy.float32)
+                distances = weights[candidates] - 2 * (points @ colors[candidates].T.astype(numpy.float32))
+                table[r:r + 16, g:g + 16, b:b + 16] = candidates[distances.argmin(1)].reshape(16, 16, 16)
+
+    # Index by r | g << 8 | b << 16, the value of a little-endian RGBX pixel
+    return numpy.ascontiguousarray(table.transpose(2, 1, 0)).reshape(-1)
+
+
+@functools.lru_cache(maxsize=None)
+def lookup_table():
+    """Returns a table mapping every 24-bit color to the index of the nearest
+    color in the Quake palette. Ties go to the lowest index.
+
+    Returns:
+        A NumPy array of 2^24 indices where the index of a color is
+        r | g << 8 | b << 16. None if NumPy is not available.
+    """
+    if numpy is None:
+        return None
+
+    path = os.path.join(cache_directory(), f'palette-{_palette_digest}.npy')
+
+    try:
+        table = numpy.load(path)
+
+        if table.shape == (1 << 24,) and table.dtype == numpy.uint8:
+            return table
+
+    except (OSError, ValueError):
+        pass
+
+    table = _build_table()
+
+    # Caching is best effort
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+
+        with open(temp_path, 'wb') as file:
+            numpy.save(file, table)
+
+        os.replace(temp_path, path)
+
+    except OSError:
+        pass
+
+    return table
+
+
+def quantizer(compatible=False):
+    """Describes how quantize() converts colors, so results cached on disk
+    are only reused when they would be converted the same way.
+
+    Args:
+        compatible: The compatible argument given to quantize().
+
+    Returns:
+        A tuple of strings.
+    """
+    if compatible or numpy is None:
+        return 'pillow', PIL.__version__, _palette_digest
+
+    return 'table', _palette_digest
+
+
+def quantize(image, compatible=False):
+    """Converts an image to the Quake palette.
+
+    Args:
+        image: An Image object.
+
+        compatible: If True, the image is quantized by Pillow with dithering
+            as done by earlier versions.
+
+    Returns:
+        An Image object in P mode with the Quake palette.
+    """
+    table = None if compatible else lookup_table()
+
+    if table is None:
+        return image.quantize(palette=palette_image())
+
+    pixels = numpy.frombuffer(image.convert('RGBX').tobytes(), dtype='<u4')
+    indices = table.take(pixels & 0xFFFFFF)
+
+    result = Image.frombytes('P', image.size, indices.tobytes())
+    result.putpalette(palette)
+
+    return result
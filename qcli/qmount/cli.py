@@ -6,6 +6,7 @@ Supported Games:
 
 
 import argparse
+import contextlib
 import os
 import signal
 import sys
@@ -16,6 +17,7 @@ from watchdog.observers import Observer
 from vgio.quake import pak
 
 import qcli
+from qcli.archive import MappedArchive, reachable, target_path, write_stream
 from qcli.common import Parser, ResolvePathAction
 from qcli.qmount.handlers import TempPakFileHandler
 import qcli.qmount.platforms as platforms
@@ -71,31 +73,29 @@ def main():
 
     archive_name = os.path.basename(args.file)
     context = {'dirty': False}
+    temp_directory = platforms.temp_volume(archive_name)
+
+    # Maps entry names to where their contents are read from when the pak
+    # file is written. Unmodified entries are PakInfo objects referring to
+    # the original pak file, created or modified entries are paths into the
+    # temporary directory. File data is never held in memory.
     files = {}
 
-    # If the pak file exists put the contents into the file dictionary
+    # If the pak file exists copy its contents into the temporary directory
     if os.path.exists(args.file):
         with pak.PakFile(args.file) as pak_file:
-            for info in pak_file.infolist():
-                name = info.filename
-                files[name] = pak_file.read(name)
+            info_list = [i for i in reachable(pak_file.infolist(), pak_file.NameToInfo) if not i.filename.endswith('/')]
+
+        with MappedArchive(args.file) as archive:
+            for info in info_list:
+                abs_path = target_path(temp_directory, info.filename)
+                os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+                archive.copy(info, abs_path)
+                files[info.filename] = info
 
     else:
         context['dirty'] = True
 
-    temp_directory = platforms.temp_volume(archive_name)
-
-    # Copy pak file contents into the temporary directory
-    for filename in files:
-        abs_path = os.path.join(temp_directory, filename)
-        dir = os.path.dirname(abs_path)
-
-        if not os.path.exists(dir):
-            os.makedirs(dir)
-
-        with open(abs_path, 'wb') as out_file:
-            out_file.write(files[filename])
-
     # Open a native file browser
     if args.open_file_browser:
         platforms.open_file_browser(temp_directory)
@@ -141,11 +141,56 @@ def main():
 
     # Write out updated files
     if context['dirty']:
+        # Never drop entries silently. If the temporary directory is gone,
+        # for example because the volume was ejected, changed files can't be
+        # read and the deletions seen while it went away can't be told from
+        # real ones, so the original pak file is left alone.
+        missing = [n for n, source in files.items() if not isinstance(source, pak.PakInfo) and not os.path.isfile(source)]
+
+        for name in missing:
+            print(f'{parser.prog}: error: {name}: missing from {temp_directory}', file=sys.stderr)
+
+        if not os.path.isdir(temp_directory):
+            print(f'{parser.prog}: error: {temp_directory} is gone', file=sys.stderr)
+            missing = True
+
+        if missing:
+            print(f'{parser.prog}: error: {archive_name} was not updated', file=sys.stderr)
+            sys.exit(1)
+
         print(f'Updating changes to {archive_name}')
 
-        with pak.PakFile(args.file, 'w') as pak_file:
-            for filename in files:
-                pak_file.writestr(filename, files[filename])
+        temp_file = f'{args.file}.tmp'
+
+        # Unmodified entries are copied from the original pak file, changed
+        # ones are streamed from the temporary directory. The finished
+        # archive replaces the original
+        try:
+            with contextlib.ExitStack() as stack:
+                pak_file = stack.enter_context(pak.PakFile(temp_file, 'w'))
+
+                if any(isinstance(source, pak.PakInfo) for source in files.values()):
+                    archive = stack.enter_context(MappedArchive(args.file))
+
+                for filename, source in files.items():
+                    if isinstance(source, pak.PakInfo):
+                        file = archive.open(source)
+
+                    else:
+                        file = open(source, 'rb')
+
+                    with file:
+                        write_stream(pak_file, pak.PakInfo(filename), file)
+
+        except (OSError, ValueError) as e:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+            print(f'{parser.prog}: error: {e}', file=sys.stderr)
+            print(f'{parser.prog}: error: {archive_name} was not updated', file=sys.stderr)
+            sys.exit(1)
+
+        os.replace(temp_file, args.file)
 
     else:
         print(f'No changes detected to {archive_name}')
@@ -5,7 +5,9 @@ from watchdog.events import PatternMatchingEventHandler as Handler
 
 class TempPakFileHandler(Handler):
     """A Watchdog handler that maintains a list of files to be written out to
-    the target pak file.
+    the target pak file. Created or modified files are tracked by path and
+    their contents are read from the working directory when the pak file is
+    written. Other entries keep referring to the original pak file.
     """
 
     def __init__(self, context, working_directory, files, verbose=False, **kwargs):
@@ -22,8 +24,7 @@ class TempPakFileHandler(Handler):
             print('{0} modified'.format(os.path.relpath(event.src_path, self.working_directory)))
 
         rel_path = os.path.relpath(event.src_path, self.working_directory)
-        with open(event.src_path, 'rb') as file:
-            self.files[rel_path] = file.read()
+        self.files[rel_path] = event.src_path
 
     def on_created(self, event):
         self.context['dirty'] = True
@@ -32,9 +33,7 @@ class TempPakFileHandler(Handler):
             print('{0} created'.format(os.path.relpath(event.src_path, self.working_directory)))
 
         rel_path = os.path.relpath(event.src_path, self.working_directory)
-
-        with open(event.src_path, 'rb') as file:
-            self.files[rel_path] = file.read()
+        self.files[rel_path] = event.src_path
 
     def on_deleted(self, event):
         self.context['dirty'] = True
@@ -54,4 +53,5 @@ class TempPakFileHandler(Handler):
         rel_src_path = os.path.relpath(event.src_path, self.working_directory)
         rel_dest_path = os.path.relpath(event.dest_path, self.working_directory)
 
-        self.files[rel_dest_path] = self.files.pop(rel_src_path, None)
+        self.files.pop(rel_src_path, None)
+        self.files[rel_dest_path] = event.dest_path
@@ -108,7 +108,8 @@ def unmount_temp_volume(path):
             )
 
     else:
-        shutil.rmtree(path)
+        if os.path.exists(path):
+            shutil.rmtree(path)
 
 
 def open_file_browser(path):
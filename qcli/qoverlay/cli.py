@@ -0,0 +1,238 @@
+"""Command line utility for resolving files across the pak files of a game
+directory the way the engine does
+
+Supported Games:
+    - QUAKE
+"""
+
+
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import qcli
+from qcli.archive import MappedArchive, select, target_path
+from qcli.common import Parser, ResolvePathAction, write_rows
+from qcli.qoverlay.index import cache_path, read_index
+
+
+def main():
+    parser = Parser(
+        prog='qoverlay',
+        description='Default action is to extract the files the engine would '
+                    'load from the pak files in gamedir to xdir. Files in '
+                    'later pak files override earlier ones.',
+        epilog='example: qoverlay id1 -d ./out => extract the effective '
+               'contents of id1/pak*.pak to ./out'
+    )
+
+    parser.add_argument(
+        'directory',
+        metavar='gamedir',
+        action=ResolvePathAction
+    )
+
+    parser.add_argument(
+        'names',
+        nargs='*',
+        metavar='name',
+        help='only files matching the given names or glob patterns'
+    )
+
+    parser.add_argument(
+        '-x',
+        metavar='name',
+        dest='exclude',
+        action='append',
+        default=[],
+        help='leave out files matching the given name or glob pattern'
+    )
+
+    parser.add_argument(
+        '--regex',
+        dest='regex',
+        action='store_true',
+        help='treat names as regular expressions'
+    )
+
+    parser.add_argument(
+        '-l', '--list',
+        action='store_true',
+        help='list files and the pak file they resolve to'
+    )
+
+    parser.add_argument(
+        '--list-format',
+        dest='list_format',
+        default='table',
+        choices=['table', 'ndjson', 'csv', 'tsv'],
+        help='list output format [default: table]'
+    )
+
+    parser.add_argument(
+        '-d',
+        metavar='xdir',
+        dest='dest',
+        default=os.getcwd(),
+        action=ResolvePathAction,
+        help='extract files into xdir'
+    )
+
+    parser.add_argument(
+        '-u', '--update',
+        dest='update',
+        action='store_true',
+        help='skip files that already exist with the same size'
+    )
+
+    parser.add_argument(
+        '--checksum',
+        dest='checksum',
+        action='store_true',
+        help='with -u, also compare the contents of existing files'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='extract N files at a time'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='do not read or write the cached index of the pak files in gamedir'
+    )
+
+    parser.add_argument(
+        '-q',
+        dest='quiet',
+        action='store_true',
+        help='quiet mode'
+    )
+
+    parser.add_argument(
+        '-v', '--version',
+        dest='version',
+        action='version',
+        help=argparse.SUPPRESS,
+        version=f'{parser.prog} version {qcli.__version__}'
+    )
+
+    args = parser.parse_intermixed_args()
+
+    if not os.path.isdir(args.directory):
+        print(f'{parser.prog}: cannot find or open {args.directory}', file=sys.stderr)
+        sys.exit(1)
+
+    cache_file = cache_path(args.directory) if args.cache else None
+    pak_files, index = read_index(args.directory, cache_file)
+
+    if not pak_files:
+        print(f'{parser.prog}: no pak files found in {args.directory}', file=sys.stderr)
+        sys.exit(1)
+
+    name_index = {name: info for name, (info, number) in index.items()}
+
+    try:
+        info_list, unmatched = select(list(name_index.values()), name_index, args.names, args.exclude, args.regex)
+
+    except re.error as e:
+        parser.error(f'invalid pattern: {e}')
+
+    for name in unmatched:
+        print(f'{parser.prog}: caution: filename not matched: {name}', file=sys.stderr)
+
+    info_list = sorted(info_list, key=lambda i: i.filename)
+
+    def pak_name(info):
+        return os.path.basename(pak_files[index[info.filename][1]])
+
+    if args.list:
+        if args.list_format != 'table':
+            fields = ['name', 'pak', 'offset', 'size']
+            rows = ([i.filename, pak_name(i), i.file_offset, i.file_size] for i in info_list)
+            write_rows(rows, fields, args.list_format)
+
+            sys.exit(1 if unmatched else 0)
+
+        from tabulate import tabulate
+
+        headers = ['Length', 'Pak', 'Name']
+        table = [[i.file_size, pak_name(i), i.filename] for i in info_list]
+        length = sum([i.file_size for i in info_list])
+        count = len(info_list)
+        table.append([length, '', f'{count} file{"s" if count != 1 else ""}'])
+
+        separator = []
+        for i in range(len(headers)):
+            t = max(len(str(length)), len(headers[i]) + 2)
+            separator.append('-' * t)
+
+        table.insert(-1, separator)
+
+        print(f'Directory: {os.path.basename(args.directory)}')
+        print(tabulate(table, headers=headers))
+
+        sys.exit(1 if unmatched else 0)
+
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
+    # Create the directory tree once so workers never race to create it
+    directories = {os.path.dirname(target_path(args.dest, i.filename)) for i in info_list}
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    archives = []
+
+    def extract(item):
+        path = target_path(args.dest, item.filename)
+        archive = archives[index[item.filename][1]]
+
+        try:
+            if args.update and archive.same(item, path, args.checksum):
+                return True
+
+            archive.copy(item, path)
+
+        except Exception as e:
+            return e
+
+    errors = 0
+
+    try:
+        # Each file is read once from the pak file it resolves to
+        for filename in pak_files:
+            archives.append(MappedArchive(filename))
+
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            for item, result in zip(info_list, executor.map(extract, info_list)):
+                fullpath = os.path.join(args.dest, item.filename)
+
+                # Identical file already exists
+                if result is True:
+                    continue
+
+                if not args.quiet:
+                    print(f' extracting: {fullpath}')
+
+                if isinstance(result, Exception):
+                    errors += 1
+                    print(f'{parser.prog}: error: {item.filename}: {result!r}', file=sys.stderr)
+
+    finally:
+        for archive in archives:
+            archive.close()
+
+    sys.exit(1 if errors or unmatched else 0)
+
+
+if __name__ == '__main__':
+    main()
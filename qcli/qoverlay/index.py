@@ -0,0 +1,149 @@
+"""Module for building a merged index over a directory of pak files
+
+The Quake engine loads pak0.pak, pak1.pak, ... from a game directory and
+searches them in reverse order, so a file in a later pak overrides the same
+file in an earlier one.
+"""
+
+import json
+import os
+import re
+
+from vgio.quake import pak
+
+from qcli.archive import hasher
+from qcli.common import cache_directory
+
+
+__all__ = ['cache_path', 'find_pak_files', 'read_index']
+
+VERSION = 1
+
+pak_name_pattern = re.compile(r'pak(\d+)\.pak', re.IGNORECASE)
+
+
+def find_pak_files(directory):
+    """Finds the pak files the engine would load from the given directory.
+    Numbering starts at pak0.pak and stops at the first missing number.
+
+    Args:
+        directory: A path to a game directory.
+
+    Returns:
+        A list of pak file paths in load order.
+    """
+    numbered = {}
+
+    for name in os.listdir(directory):
+        match = pak_name_pattern.fullmatch(name)
+
+        if match:
+            numbered.setdefault(int(match.group(1)), name)
+
+    result = []
+
+    for number in range(len(numbered)):
+        if number not in numbered:
+            break
+
+        result.append(os.path.join(directory, numbered[number]))
+
+    return result
+
+
+def cache_path(directory):
+    """Returns the path of the index cache file for the given game directory.
+    Cache files are kept in the user cache directory, named by the game
+    directory's real path.
+
+    Args:
+        directory: A path to a game directory.
+
+    Returns:
+        A file path.
+    """
+    h = hasher()
+    h.update(os.path.realpath(directory).encode('utf-8', 'surrogateescape'))
+
+    return os.path.join(cache_directory(), 'qoverlay', f'{h.hexdigest()}.json')
+
+
+def _stat(pak_files):
+    result = []
+
+    for filename in pak_files:
+        stat = os.stat(filename)
+        result.append([os.path.basename(filename), stat.st_size, stat.st_mtime_ns])
+
+    return result
+
+
+def _build_index(pak_files):
+    entries = {}
+
+    for number, filename in enumerate(pak_files):
+        with pak.PakFile(filename) as pak_file:
+            for info in pak_file.infolist():
+                entries[info.filename] = [number, info.file_offset, info.file_size]
+
+    return entries
+
+
+def read_index(directory, cache_file=None):
+    """Returns the merged index for the given game directory. If a cache file
+    is given it is used when it matches the size and modification time of
+    every pak file, otherwise the index is rebuilt and the cache rewritten.
+
+    Args:
+        directory: A path to a game directory.
+
+        cache_file: Optional. A path to the index cache file.
+
+    Returns:
+        A tuple of the list of pak file paths in load order and a dictionary
+        mapping each file name to a PakInfo object and the position of the pak
+        file it resolves to.
+    """
+    pak_files = find_pak_files(directory)
+    stats = _stat(pak_files)
+    entries = None
+
+    if cache_file:
+        try:
+            with open(cache_file) as file:
+                cache = json.load(file)
+
+            if cache.get('version') == VERSION and cache.get('paks') == stats:
+                entries = cache['entries']
+
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    if entries is None:
+        entries = _build_index(pak_files)
+
+        # Caching is best effort
+        if cache_file:
+            temp_file = f'{cache_file}.{os.getpid()}.tmp'
+
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+                with open(temp_file, 'w') as file:
+                    json.dump({'version': VERSION, 'paks': stats, 'entries': entries}, file)
+
+                os.replace(temp_file, cache_file)
+
+            except OSError:
+                try:
+                    os.remove(temp_file)
+
+                except OSError:
+                    pass
+
+    index = {}
+
+    for name, (number, offset, size) in entries.items():
+        index[name] = pak.PakInfo(name, offset, size), number
+
+    return pak_files, index
@@ -9,18 +9,22 @@ import argparse
 import os
 import sys
 
-import vgio
 from PIL import Image
-from vgio.quake import spr
+from vgio.quake import pak, spr
 
 import qcli
+from qcli.archive import expand_member_paths, open_member_path, split_member_path
 from qcli.common import Parser
 from qcli.common import ResolvePathAction
+from qcli.palette import palette
 
 def main():
     parser = Parser(
         prog='spr2image',
-        description='Default action is to convert a spr file to a gif.',
+        description='Default action is to convert a spr file to a gif. A spr '
+                    'file in a pak file can be given as '
+                    'file.pak:progs/s_bubble.spr, or as a glob pattern like '
+                    '\'file.pak:progs/*.spr\' to convert every match.',
         epilog='example: spr2image bubble.spr => convert bubble.spr to bubble.gif'
     )
 
@@ -56,78 +60,94 @@ def main():
 
     args = parser.parse_args()
 
-    # Validate source file
-    if not spr.is_sprfile(args.file):
-        print(f'{parser.prog}: cannot find or open {args.file}', file=sys.stderr)
-        sys.exit(1)
-
-    # Validate or create out file
-    if args.dest == os.getcwd():
-        image_path = os.path.dirname(args.file)
-        image_name = os.path.basename(args.file).split('.')[0] + '.gif'
-        args.dest = os.path.join(image_path, image_name)
-
-    dest_dir = os.path.dirname(args.dest) or '.'
-    if not os.path.exists(dest_dir):
-        os.makedirs(dest_dir)
-
-    image_filename = os.path.basename(args.dest)
-    image_extension = image_filename.split('.')[-1]
-
-    with spr.Spr.open(args.file) as spr_file:
-        if not args.quiet:
-            print(f'Converting: {os.path.basename(args.file)}')
-
-        # Flatten out palette
-        palette = [channel for rgb in vgio.quake.palette for channel in rgb]
-
-        # Default frame animation is 10 frames per second
-        default_duration = 10 / 60 * 1000
-
-        # Build a sequence of images from spr frames
-        images = []
-        for frame in spr_file.frames:
-            if frame.type == spr.SINGLE:
-                size = frame.width, frame.height
-                data = array.array('B', frame.pixels)
-
-                img = Image.frombuffer('P', size, data, 'raw', 'P', 0, 1)
-                img.putpalette(palette)
-                images.append(img)
-
-            else:
-                print(f'{parser.prog}: frame groups are not supported', file=sys.stderr)
-                sys.exit(1)
-
-    # Save as gif
-    if image_extension.upper() == 'GIF':
-        first_frame = images[0]
-        first_frame.putpalette(palette)
-        remaining_frames = images[1:]
-        first_frame.save(
-            args.dest,
-            save_all=True,
-            append_images=remaining_frames,
-            duration=default_duration,
-            loop=0,
-            optimize=False,
-            #transparency=255,
-            palette=palette
-        )
-
-    else:
-        image_directory = os.path.dirname(args.dest)
-        image_name = image_filename.split('.')[0]
-        for image_index, image in enumerate(images):
-            filename = '{}_{}.{}'.format(image_name, image_index, image_extension)
-            image.save(
-                os.path.join(image_directory, filename),
+    files = list(expand_member_paths([args.file]))
+
+    if len(files) > 1 and args.dest != os.getcwd():
+        parser.error(f'argument -d: not allowed when {args.file} matches several files')
+
+    errors = False
+
+    for file in files:
+        # Validate source file
+        try:
+            with open_member_path(file) as source:
+                is_sprfile = spr.is_sprfile(source)
+
+        except (OSError, pak.BadPakFile):
+            is_sprfile = False
+
+        if not is_sprfile:
+            print(f'{parser.prog}: cannot find or open {file}', file=sys.stderr)
+            errors = True
+            continue
+
+        # Validate or create out file
+        dest = args.dest
+
+        if dest == os.getcwd():
+            archive, name = split_member_path(file)
+            image_path = os.path.dirname(archive)
+            image_name = os.path.basename(name or archive).split('.')[0] + '.gif'
+            dest = os.path.join(image_path, image_name)
+
+        dest_dir = os.path.dirname(dest) or '.'
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+
+        image_filename = os.path.basename(dest)
+        image_extension = image_filename.split('.')[-1]
+
+        with open_member_path(file) as source, spr.Spr.open(source) as spr_file:
+            if not args.quiet:
+                print(f'Converting: {os.path.basename(file)}')
+
+            # Default frame animation is 10 frames per second
+            default_duration = 10 / 60 * 1000
+
+            # Build a sequence of images from spr frames
+            images = []
+            for frame in spr_file.frames:
+                if frame.type == spr.SINGLE:
+                    size = frame.width, frame.height
+                    data = array.array('B', frame.pixels)
+
+                    img = Image.frombuffer('P', size, data, 'raw', 'P', 0, 1)
+                    img.putpalette(palette)
+                    images.append(img)
+
+                else:
+                    print(f'{parser.prog}: frame groups are not supported', file=sys.stderr)
+                    sys.exit(1)
+
+        # Save as gif
+        if image_extension.upper() == 'GIF':
+            first_frame = images[0]
+            first_frame.putpalette(palette)
+            remaining_frames = images[1:]
+            first_frame.save(
+                dest,
+                save_all=True,
+                append_images=remaining_frames,
+                duration=default_duration,
+                loop=0,
                 optimize=False,
                 #transparency=255,
                 palette=palette
             )
 
-    sys.exit(0)
+        else:
+            image_directory = os.path.dirname(dest)
+            image_name = image_filename.split('.')[0]
+            for image_index, image in enumerate(images):
+                filename = '{}_{}.{}'.format(image_name, image_index, image_extension)
+                image.save(
+                    os.path.join(image_directory, filename),
+                    optimize=False,
+                    #transparency=255,
+                    palette=palette
+                )
+
+    sys.exit(1 if errors else 0)
 
 if __name__ == '__main__':
     main()
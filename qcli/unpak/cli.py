@@ -7,13 +7,18 @@ Supported Games:
 
 import argparse
 import os
+import re
+import struct
 import sys
-from tabulate import tabulate
+import tarfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 from vgio.quake import pak
 
 import qcli
-from qcli.common import Parser, ResolvePathAction
+from qcli.archive import MappedArchive, check_archive, check_directory, reachable, select, target_path
+from qcli.common import Parser, ResolvePathAction, write_rows
 
 
 def main():
@@ -29,12 +34,65 @@ def main():
         action=ResolvePathAction
     )
 
+    parser.add_argument(
+        'names',
+        nargs='*',
+        metavar='name',
+        help='only files matching the given names or glob patterns'
+    )
+
+    parser.add_argument(
+        '-x',
+        metavar='name',
+        dest='exclude',
+        action='append',
+        default=[],
+        help='leave out files matching the given name or glob pattern'
+    )
+
+    parser.add_argument(
+        '--regex',
+        dest='regex',
+        action='store_true',
+        help='treat names as regular expressions'
+    )
+
     parser.add_argument(
         '-l', '--list',
         action='store_true',
         help='list files'
     )
 
+    parser.add_argument(
+        '-t', '--verify',
+        dest='verify',
+        action='store_true',
+        help='test that files lie within the archive and hash their contents. '
+             'If file.pak.checksums exists the contents are compared against it'
+    )
+
+    parser.add_argument(
+        '--write-checksums',
+        dest='write_checksums',
+        action='store_true',
+        help='test the archive and write file.pak.checksums'
+    )
+
+    parser.add_argument(
+        '--list-format',
+        dest='list_format',
+        default='table',
+        choices=['table', 'ndjson', 'csv', 'tsv'],
+        help='list output format [default: table]'
+    )
+
+    parser.add_argument(
+        '--crc',
+        dest='crc',
+        action='store_true',
+        help='include the CRC-32 of each file when listing'
+    )
+
     parser.add_argument(
         '-d',
         metavar='xdir',
@@ -44,6 +102,36 @@ def main():
         help='extract files into xdir'
     )
 
+    parser.add_argument(
+        '--to-tar',
+        metavar='file.tar',
+        dest='to_tar',
+        help='write files to a tar file instead of extracting them, - for stdout'
+    )
+
+    parser.add_argument(
+        '-u', '--update',
+        dest='update',
+        action='store_true',
+        help='skip files that already exist with the same size'
+    )
+
+    parser.add_argument(
+        '--checksum',
+        dest='checksum',
+        action='store_true',
+        help='with -u, also compare the contents of existing files'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='extract or test N files at a time'
+    )
+
     parser.add_argument(
         '-q',
         dest='quiet',
@@ -59,21 +147,105 @@ def main():
         version=f'{parser.prog} version {qcli.__version__}'
     )
 
-    args = parser.parse_args()
+    args = parser.parse_intermixed_args()
 
     if not pak.is_pakfile(args.file):
         print(f'{parser.prog}: cannot find or open {args.file}', file=sys.stderr)
         sys.exit(1)
 
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
+    if args.verify or args.write_checksums:
+        try:
+            check_directory(args.file, pak)
+
+        except ValueError as e:
+            print(f'{parser.prog}: error: {e}', file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        pak_file = pak.PakFile(args.file)
+
+    except (struct.error, EOFError, ValueError, pak.BadPakFile):
+        print(f'{parser.prog}: error: {args.file} is truncated or corrupt', file=sys.stderr)
+        sys.exit(1)
+
+    with pak_file:
+        name_index = pak_file.NameToInfo
+
+        try:
+            info_list, unmatched = select(pak_file.infolist(), name_index, args.names, args.exclude, args.regex)
+
+        except re.error as e:
+            parser.error(f'invalid pattern: {e}')
+
+    for name in unmatched:
+        print(f'{parser.prog}: caution: filename not matched: {name}', file=sys.stderr)
+
+    if args.verify or args.write_checksums:
+        try:
+            errors, entries = check_archive(
+                args.file,
+                info_list,
+                name_index,
+                write=args.write_checksums,
+                check_missing=not args.names and not args.exclude,
+                jobs=args.jobs
+            )
+
+        except ValueError as e:
+            print(f'{parser.prog}: {e}', file=sys.stderr)
+            sys.exit(1)
+
+        if not args.quiet:
+            print(f'Archive: {os.path.basename(args.file)}')
+
+            for name in entries:
+                print(f'    testing: {name}  OK')
+
+        for name, message in errors:
+            print(f'{parser.prog}: error: {name}: {message}', file=sys.stderr)
+
+        if not args.quiet:
+            if errors:
+                print(f'{len(errors)} error{"s" if len(errors) != 1 else ""} detected in {os.path.basename(args.file)}')
+
+            else:
+                print(f'No errors detected in {os.path.basename(args.file)}')
+
+        sys.exit(1 if errors or unmatched else 0)
+
     if args.list:
-        with pak.PakFile(args.file) as pak_file:
-            info_list = sorted(pak_file.infolist(), key=lambda i: i.filename)
+        with MappedArchive(args.file) as archive:
+            def crc(info):
+                with archive.view(info) as view:
+                    return f'{zlib.crc32(view):08x}'
+
+            # Stream rows in directory order
+            if args.list_format != 'table':
+                fields = ['name', 'offset', 'size'] + (['crc32'] if args.crc else [])
+                rows = ([i.filename, i.file_offset, i.file_size] + ([crc(i)] if args.crc else []) for i in info_list)
+                write_rows(rows, fields, args.list_format)
+
+                sys.exit(1 if unmatched else 0)
+
+            # Only pay for tabulate when it is used
+            from tabulate import tabulate
+
+            info_list = sorted(info_list, key=lambda i: i.filename)
 
             headers = ['Length', 'Name']
             table = [[i.file_size, i.filename] for i in info_list]
+
+            if args.crc:
+                headers.insert(1, 'CRC-32')
+                for row, info in zip(table, info_list):
+                    row.insert(1, crc(info))
+
             length = sum([i.file_size for i in info_list])
             count = len(info_list)
-            table.append([length, f'{count} file{"s" if count == 1 else ""}'])
+            table.append([length] + [''] * (len(headers) - 2) + [f'{count} file{"s" if count == 1 else ""}'])
 
             separator = []
             for i in range(len(headers)):
@@ -85,24 +257,90 @@ def main():
             print(f'Archive: {os.path.basename(args.file)}')
             print(tabulate(table, headers=headers))
 
-            sys.exit(0)
+            sys.exit(1 if unmatched else 0)
+
+    # Extracting shadowed entries as well would have workers race on the
+    # same target
+    info_list = sorted(reachable(info_list, name_index), key=lambda i: i.filename)
+
+    if args.to_tar:
+        to_stdout = args.to_tar == '-'
+        mtime = os.path.getmtime(args.file)
+        errors = 0
+
+        if to_stdout:
+            tar_file = tarfile.open(fileobj=sys.stdout.buffer, mode='w|')
+
+        else:
+            tar_file = tarfile.open(os.path.expanduser(args.to_tar), mode='w')
+
+        # Members are streamed from the mapped archive without temporary files
+        with MappedArchive(args.file) as archive, tar_file:
+            for item in info_list:
+                if item.filename.endswith('/'):
+                    continue
+
+                if not args.quiet and not to_stdout:
+                    print(f'     adding: {item.filename}')
+
+                try:
+                    file = archive.open(item)
+
+                except Exception as e:
+                    errors += 1
+                    print(f'{parser.prog}: error: {item.filename}: {e!r}', file=sys.stderr)
+                    continue
+
+                tar_info = tarfile.TarInfo(item.filename)
+                tar_info.size = item.file_size
+                tar_info.mtime = mtime
+                tar_info.mode = 0o644
+
+                with file:
+                    tar_file.addfile(tar_info, file)
 
-    with pak.PakFile(args.file) as pak_file:
-        info_list = pak_file.infolist()
-        for item in sorted(info_list, key=lambda i: i.filename):
-            filename = item.filename
-            fullpath = os.path.join(args.dest, filename)
+        sys.exit(1 if errors or unmatched else 0)
+
+    # Create the directory tree once so workers never race to create it
+    directories = {os.path.dirname(target_path(args.dest, i.filename)) for i in info_list}
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    def extract(item):
+        path = target_path(args.dest, item.filename)
+
+        try:
+            if item.filename.endswith('/'):
+                os.makedirs(path, exist_ok=True)
+
+            elif args.update and archive.same(item, path, args.checksum):
+                return True
+
+            else:
+                archive.copy(item, path)
+
+        except Exception as e:
+            return e
+
+    errors = 0
+
+    # Workers copy byte ranges straight out of the mapped archive
+    with MappedArchive(args.file) as archive, ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for item, result in zip(info_list, executor.map(extract, info_list)):
+            fullpath = os.path.join(args.dest, item.filename)
+
+            # Identical file already exists
+            if result is True:
+                continue
 
             if not args.quiet:
                 print(f' extracting: {fullpath}')
 
-            try:
-                pak_file.extract(filename, args.dest)
-
-            except:
-                print(f'{parser.prog}: error: {sys.exc_info()[0]}', file=sys.stderr)
+            if isinstance(result, Exception):
+                errors += 1
+                print(f'{parser.prog}: error: {item.filename}: {result!r}', file=sys.stderr)
 
-    sys.exit(0)
+    sys.exit(1 if errors or unmatched else 0)
 
 
 if __name__ == '__main__':
@@ -5,19 +5,22 @@ Supported Games:
 """
 
 
-import array
 import argparse
 import os
+import re
+import struct
 import sys
-from tabulate import tabulate
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
-from vgio import quake
-from vgio.quake import lmp, wad
+from vgio.quake import wad
 
 import qcli
-from qcli.common import Parser, ResolvePathAction
+from qcli.archive import MappedArchive, check_archive, check_directory, reachable, select, target_path
+from qcli.common import Parser, ResolvePathAction, write_rows
+from qcli.palette import palette
 
 
 def main():
@@ -35,12 +38,65 @@ def main():
         action=ResolvePathAction
     )
 
+    parser.add_argument(
+        'names',
+        nargs='*',
+        metavar='name',
+        help='only files matching the given names or glob patterns'
+    )
+
+    parser.add_argument(
+        '-x',
+        metavar='name',
+        dest='exclude',
+        action='append',
+        default=[],
+        help='leave out files matching the given name or glob pattern'
+    )
+
+    parser.add_argument(
+        '--regex',
+        dest='regex',
+        action='store_true',
+        help='treat names as regular expressions'
+    )
+
     parser.add_argument(
         '-l', '--list',
         action='store_true',
         help='list files'
     )
 
+    parser.add_argument(
+        '-t', '--verify',
+        dest='verify',
+        action='store_true',
+        help='test that files lie within the archive and hash their contents. '
+             'If file.wad.checksums exists the contents are compared against it'
+    )
+
+    parser.add_argument(
+        '--write-checksums',
+        dest='write_checksums',
+        action='store_true',
+        help='test the archive and write file.wad.checksums'
+    )
+
+    parser.add_argument(
+        '--list-format',
+        dest='list_format',
+        default='table',
+        choices=['table', 'ndjson', 'csv', 'tsv'],
+        help='list output format [default: table]'
+    )
+
+    parser.add_argument(
+        '--crc',
+        dest='crc',
+        action='store_true',
+        help='include the CRC-32 of each file when listing'
+    )
+
     parser.add_argument(
         '-d',
         metavar='xdir',
@@ -50,6 +106,15 @@ def main():
         help='extract files into xdir'
     )
 
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='extract or test N files at a time'
+    )
+
     parser.add_argument(
         '-q',
         dest='quiet',
@@ -65,6 +130,16 @@ def main():
         help='image format to convert to'
     )
 
+    parser.add_argument(
+        '--compress-level',
+        metavar='N',
+        dest='compress_level',
+        type=int,
+        choices=range(10),
+        help='png compression level from 0 (fastest) to 9 (smallest) '
+             '[default: 6]'
+    )
+
     parser.add_argument(
         '-v', '--version',
         dest='version',
@@ -73,7 +148,7 @@ def main():
         version=f'{parser.prog} version {qcli.__version__}'
     )
 
-    args = parser.parse_args()
+    args = parser.parse_intermixed_args()
 
     archive_name = os.path.basename(args.file)
 
@@ -81,31 +156,115 @@ def main():
         print(f'{parser.prog}: cannot find or open {args.file}', file=sys.stderr)
         sys.exit(1)
 
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
+    if args.verify or args.write_checksums:
+        try:
+            check_directory(args.file, wad)
+
+        except ValueError as e:
+            print(f'{parser.prog}: error: {e}', file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        wad_file = wad.WadFile(args.file)
+
+    except (struct.error, EOFError, ValueError, wad.BadWadFile):
+        print(f'{parser.prog}: error: {args.file} is truncated or corrupt', file=sys.stderr)
+        sys.exit(1)
+
+    with wad_file:
+        name_index = wad_file.NameToInfo
+
+        try:
+            info_list, unmatched = select(wad_file.infolist(), name_index, args.names, args.exclude, args.regex)
+
+        except re.error as e:
+            parser.error(f'invalid pattern: {e}')
+
+    for name in unmatched:
+        print(f'{parser.prog}: caution: filename not matched: {name}', file=sys.stderr)
+
+    if args.verify or args.write_checksums:
+        try:
+            errors, entries = check_archive(
+                args.file,
+                info_list,
+                name_index,
+                write=args.write_checksums,
+                check_missing=not args.names and not args.exclude,
+                jobs=args.jobs
+            )
+
+        except ValueError as e:
+            print(f'{parser.prog}: {e}', file=sys.stderr)
+            sys.exit(1)
+
+        if not args.quiet:
+            print(f'Archive: {archive_name}')
+
+            for name in entries:
+                print(f'    testing: {name}  OK')
+
+        for name, message in errors:
+            print(f'{parser.prog}: error: {name}: {message}', file=sys.stderr)
+
+        if not args.quiet:
+            if errors:
+                print(f'{len(errors)} error{"s" if len(errors) != 1 else ""} detected in {archive_name}')
+
+            else:
+                print(f'No errors detected in {archive_name}')
+
+        sys.exit(1 if errors or unmatched else 0)
+
     if args.list:
-        with wad.WadFile(args.file) as wad_file:
-            info_list = sorted(wad_file.infolist(), key=lambda i: i.filename)
+        lump_types = {
+            0: 'NONE',
+            1: 'LABEL',
+            64: 'LUMP',
+            65: 'QTEX',
+            66: 'QPIC',
+            67: 'SOUND',
+            68: 'MIPTEX'
+        }
+
+        def lump_type(num):
+            if num in lump_types:
+                return lump_types[num]
+
+            return num
 
-            lump_types = {
-                0: 'NONE',
-                1: 'LABEL',
-                64: 'LUMP',
-                65: 'QTEX',
-                66: 'QPIC',
-                67: 'SOUND',
-                68: 'MIPTEX'
-            }
+        with MappedArchive(args.file) as archive:
+            def crc(info):
+                with archive.view(info) as view:
+                    return f'{zlib.crc32(view):08x}'
 
-            def lump_type(num):
-                if num in lump_types:
-                    return lump_types[num]
+            # Stream rows in directory order
+            if args.list_format != 'table':
+                fields = ['name', 'type', 'offset', 'size'] + (['crc32'] if args.crc else [])
+                rows = ([i.filename, lump_type(i.type), i.file_offset, i.file_size] + ([crc(i)] if args.crc else []) for i in info_list)
+                write_rows(rows, fields, args.list_format)
 
-                return num
+                sys.exit(1 if unmatched else 0)
+
+            # Only pay for tabulate when it is used
+            from tabulate import tabulate
+
+            info_list = sorted(info_list, key=lambda i: i.filename)
 
             headers = ['Length', 'Type', 'Name']
             table = [[i.file_size, lump_type(i.type), i.filename] for i in info_list]
+
+            if args.crc:
+                headers.insert(2, 'CRC-32')
+                for row, info in zip(table, info_list):
+                    row.insert(2, crc(info))
+
             length = sum([i.file_size for i in info_list])
             count = len(info_list)
-            table.append([length, '', f'{count} file{"s" if count > 1 else ""}'])
+            table.append([length] + [''] * (len(headers) - 2) + [f'{count} file{"s" if count > 1 else ""}'])
 
             separator = []
             for i in range(len(headers)):
@@ -117,76 +276,108 @@ def main():
             print(f'Archive: {archive_name}')
             print(tabulate(table, headers=headers))
 
-            sys.exit(0)
+            sys.exit(1 if unmatched else 0)
 
     if not os.path.exists(args.dest):
         os.makedirs(args.dest)
 
-    with wad.WadFile(args.file) as wad_file:
+    save_options = {}
+    if args.compress_level is not None and args.format == 'png':
+        save_options['compress_level'] = args.compress_level
+
+    def image(item, view):
+        """Returns an image over the given lump's pixels without copying
+        them, or None if the lump isn't an image."""
+        size = None
+
+        # Pictures
+        if item.type == wad.LumpType.QPIC:
+            width, height = struct.unpack_from('<2i', view)
+            offset = 8
+
+            if width < 0 or height < 0 or width * height + offset != len(view):
+                raise ValueError('unable to determine format of lump file')
+
+            size = width, height
+
+        # Special cases
+        elif item.type == wad.LumpType.MIPTEX:
+            # Console characters
+            if item.file_size == 128 * 128:
+                size = 128, 128
+                offset = 0
+
+            # Miptextures
+            else:
+                _, width, height, *_ = struct.unpack_from(wad.Miptexture.format, view)
+                offset = wad.Miptexture.size
+
+                if width < 0 or height < 0 or offset + width * height * 85 // 64 > len(view):
+                    raise ValueError('miptexture is truncated')
+
+                size = width, height
+
+        if size is None:
+            return None
+
+        pixels = view[offset:offset + size[0] * size[1]]
+        img = Image.frombuffer('P', size, pixels, 'raw', 'P', 0, 1)
+        img.putpalette(palette)
+
+        return img
+
+    def extract(item):
+        """Returns the written path, or the raised exception."""
+        path = target_path(args.dest, item.filename)
+
+        try:
+            with archive.view(item) as view:
+                img = image(item, view)
+
+                if img is not None:
+                    path = f'{path}.{args.format}'
+
+                    try:
+                        img.save(path, **save_options)
+
+                    finally:
+                        # The image must let go of the view before it is released
+                        img.close()
+                        del img
+
+                    return path
+
+            # Extract as raw file
+            archive.copy(item, path)
+
+        except Exception as e:
+            # The traceback would keep the frames holding the view alive
+            return e.with_traceback(None)
+
+        return path
+
+    # Exporting shadowed entries as well would have workers race on the same
+    # target
+    info_list = reachable(info_list, name_index)
+
+    errors = 0
+
+    # Images are decoded straight from the mapped archive and encoded on a
+    # pool of worker threads
+    with MappedArchive(args.file) as archive, ThreadPoolExecutor(max_workers=args.jobs) as executor:
         if not args.quiet:
             print(f'Archive: {archive_name}')
 
-        # Flatten out palette
-        palette = []
-        for p in quake.palette:
-            palette += p
-
-        for item in wad_file.infolist():
-            filename = item.filename
-            fullpath = os.path.join(args.dest, filename)
-            fullpath_ext = '{0}.{1}'.format(fullpath, args.format)
-
-            data = None
-            size = None
-
-            # Pictures
-            if item.type == wad.LumpType.QPIC:
-                with wad_file.open(filename) as lmp_file:
-                    lump = lmp.Lmp.open(lmp_file)
-                    size = lump.width, lump.height
-                    data = array.array('B', lump.pixels)
-
-            # Special cases
-            elif item.type == wad.LumpType.MIPTEX:
-                # Console characters
-                if item.file_size == 128 * 128:
-                    size = 128, 128
-
-                    with wad_file.open(filename) as lump:
-                        data = lump.read(item.file_size)
-
-                else:
-                    # Miptextures
-                    try:
-                        with wad_file.open(filename) as mip_file:
-                            mip = wad.Miptexture.read(mip_file)
-                            data = mip.pixels[:mip.width * mip.height]
-                            data = array.array('B', data)
-                            size = mip.width, mip.height
-                    except:
-                        print(f' failed to extract resource: {item.filename}', file=sys.stderr)
-                        continue
-
-            try:
-                # Convert to image file
-                if data is not None and size is not None:
-                    img = Image.frombuffer('P', size, data, 'raw', 'P', 0, 1)
-                    img.putpalette(palette)
-                    img.save(fullpath_ext)
-
-                    if not args.quiet:
-                        print(f' extracting: {fullpath_ext}')
-
-                # Extract as raw file
-                else:
-                    wad_file.extract(filename, args.dest)
-
-                    if not args.quiet:
-                        print(f' extracting: {fullpath}')
-            except:
-                print(f'{parser.prog}: error: {sys.exc_info()[1]}', file=sys.stderr)
-
-    sys.exit(0)
+        for item, result in zip(info_list, executor.map(extract, info_list)):
+            if isinstance(result, Exception):
+                errors += 1
+                print(f' failed to extract resource: {item.filename}: {result}', file=sys.stderr)
+                continue
+
+            if not args.quiet:
+                print(f' extracting: {result}')
+
+    sys.exit(1 if errors or unmatched else 0)
 
 
 if __name__ == '__main__':
@@ -5,23 +5,34 @@ Supported Games:
 """
 
 import argparse
+import contextlib
+import functools
 import io
+import multiprocessing
 import os
-import struct
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from PIL import Image
-
-from vgio import quake
-from vgio.quake import lmp, wad
+from vgio.quake import wad
 
 import qcli
-from qcli.common import Parser, ResolvePathAction, read_from_stdin
+from qcli.cache import Cache
+from qcli.common import Parser, ResolvePathAction, peek, read_from_stdin
+from qcli.palette import lookup_table
+from qcli.wad import converter
+
+lump_types = {
+    'QPIC': wad.LumpType.QPIC,
+    'MIPTEX': wad.LumpType.MIPTEX
+}
 
 
 def main():
     """CLI entrypoint"""
 
+    # Support worker processes in frozen packages
+    multiprocessing.freeze_support()
+
     # Create and configure argument parser
     parser = Parser(
         prog='wad',
@@ -42,7 +53,7 @@ def main():
         'list',
         nargs='*',
         action=ResolvePathAction,
-        default=read_from_stdin()
+        default=[]
     )
 
     parser.add_argument(
@@ -53,6 +64,47 @@ def main():
         help='list data type [default: MIPTEX]'
     )
 
+    parser.add_argument(
+        '--mip-filter',
+        dest='mip_filter',
+        default='nearest',
+        choices=['nearest', 'box'],
+        help='filter used to downsample MIPTEX mip levels [default: nearest]'
+    )
+
+    parser.add_argument(
+        '--compatible',
+        dest='compatible',
+        action='store_true',
+        help='quantize colors with dithering, matching earlier versions '
+             'byte for byte'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='always convert images instead of reusing lumps converted by '
+             'earlier runs'
+    )
+
+    parser.add_argument(
+        '-0', '--null',
+        dest='null',
+        action='store_true',
+        help='items read from stdin are separated by NUL characters, as '
+             'produced by find -print0'
+    )
+
+    parser.add_argument(
+        '-j',
+        metavar='N',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='convert N images at a time'
+    )
+
     parser.add_argument(
         '-q',
         dest='quiet',
@@ -71,8 +123,16 @@ def main():
     args = parser.parse_args()
 
     if not args.list:
+        args.list = map(os.path.expanduser, read_from_stdin(args.null))
+
+    first, args.list = peek(args.list)
+
+    if first is None:
         parser.error('the following arguments are required: list')
 
+    if args.jobs < 1:
+        parser.error('argument -j: must be at least 1')
+
     if args.quiet:
         def log(message):
             pass
@@ -92,85 +152,55 @@ def main():
     with wad.WadFile(args.file, filemode) as wad_file:
         log(f'Archive: {os.path.basename(args.file)}')
 
-        # Flatten out palette
-        palette = []
-        for p in quake.palette:
-            palette += p
-
-        # Create palette image for Image.quantize()
-        palette_image = Image.frombytes('P', (16, 16), bytes(palette))
-        palette_image.putpalette(palette)
-
-        # Process input files
-        for file in args.list:
-            if args.type == 'LUMP':
+        if args.type == 'LUMP':
+            for file in args.list:
                 log(f'  adding: {file}')
                 wad_file.write(file)
 
-            elif args.type == 'QPIC':
-                img = Image.open(file).convert(mode='RGB')
-                img = img.quantize(palette=palette_image)
-                pixels = img.tobytes()
-                name = os.path.basename(file).split('.')[0]
+            sys.exit(0)
 
-                qpic = lmp.Lmp()
-                qpic.width = img.width
-                qpic.height = img.height
-                qpic.pixels = pixels
+        cache = None if args.no_cache else Cache('lumps')
 
-                buff = io.BytesIO()
-                lmp.Lmp.write(buff, qpic)
-                file_size = buff.tell()
-                buff.seek(0)
+        convert = functools.partial(
+            converter.convert,
+            type=args.type,
+            compatible=args.compatible,
+            mip_filter=args.mip_filter,
+            cache=cache
+        )
 
-                info = wad.WadInfo(name)
-                info.file_size = file_size
-                info.disk_size = info.file_size
-                info.compression = wad.CompressionType.NONE
-                info.type = wad.LumpType.QPIC
+        with contextlib.ExitStack() as stack:
+            if args.jobs > 1:
+                # Build the palette lookup table once instead of in every worker
+                if not args.compatible:
+                    lookup_table()
 
-                log(f'  adding: {file}')
-
-                wad_file.writestr(info, buff)
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs))
+                files = list(args.list)
+                lumps = zip(files, executor.map(convert, files))
 
             else:
-                try:
-                    img = Image.open(file).convert(mode='RGB')
-                    img = img.quantize(palette=palette_image)
-
-                    name = os.path.basename(file).split('.')[0]
-
-                    mip = wad.Miptexture()
-                    mip.name = name
-                    mip.width = img.width
-                    mip.height = img.height
-                    mip.offsets = [40]
-                    mip.pixels = []
-
-                    # Build mip maps
-                    for i in range(4):
-                        resized_image = img.resize((img.width // pow(2, i), img.height // pow(2, i)))
-                        data = resized_image.tobytes()
-                        mip.pixels += struct.unpack(f'<{len(data)}B', data)
-                        if i < 3:
-                            mip.offsets += [mip.offsets[-1] + len(data)]
-
-                    buff = io.BytesIO()
-                    wad.Miptexture.write(buff, mip)
-                    buff.seek(0)
+                lumps = ((file, convert(file)) for file in args.list)
 
+            # Lumps are written in input order regardless of when their
+            # conversion finishes
+            try:
+                for file, (name, data) in lumps:
                     info = wad.WadInfo(name)
-                    info.file_size = 40 + len(mip.pixels)
+                    info.file_size = len(data)
                     info.disk_size = info.file_size
                     info.compression = wad.CompressionType.NONE
-                    info.type = wad.LumpType.MIPTEX
+                    info.type = lump_types[args.type]
 
                     log(f'  adding: {file}')
 
-                    wad_file.writestr(info, buff)
+                    wad_file.writestr(info, io.BytesIO(data))
+
+            except Exception as e:
+                parser.error(e)
 
-                except:
-                    parser.error(sys.exc_info()[1])
+        if cache:
+            cache.trim()
 
     sys.exit(0)
 
@@ -0,0 +1,137 @@
+"""Module for converting image files to wad lumps
+
+The functions here are run in worker processes by wad -j, so they only take
+and return picklable values.
+"""
+
+import io
+import os
+import struct
+
+from PIL import Image
+
+from vgio.quake import lmp, wad
+
+import qcli
+from qcli.archive import file_digest
+from qcli.palette import quantize, quantizer
+
+
+__all__ = ['convert', 'miptex', 'qpic']
+
+
+def qpic(file, compatible=False):
+    """Converts an image file to a QPIC lump.
+
+    Args:
+        file: The image file path.
+
+        compatible: If True, colors are quantized as done by earlier versions.
+
+    Returns:
+        The lump data as bytes.
+    """
+    img = Image.open(file).convert(mode='RGB')
+    img = quantize(img, compatible)
+
+    qpic = lmp.Lmp()
+    qpic.width = img.width
+    qpic.height = img.height
+    qpic.pixels = img.tobytes()
+
+    buff = io.BytesIO()
+    lmp.Lmp.write(buff, qpic)
+
+    return buff.getvalue()
+
+
+def miptex(file, compatible=False, mip_filter='nearest'):
+    """Converts an image file to a MIPTEX lump with four mip levels.
+
+    Args:
+        file: The image file path.
+
+        compatible: If True, colors are quantized as done by earlier versions.
+
+        mip_filter: How mip levels are downsampled. Either 'nearest' to
+            sample the quantized image, or 'box' to average the source colors
+            before quantizing each level.
+
+    Returns:
+        The lump data as bytes.
+    """
+    img = Image.open(file).convert(mode='RGB')
+    width, height = img.size
+
+    # Each mip level halves the size, down to an eighth
+    if not width or not height or width % 8 or height % 8:
+        raise ValueError(f'{file}: {width}x{height} is not a valid miptexture size, dimensions should be multiples of 8')
+
+    quantized = quantize(img, compatible)
+
+    # Build mip maps
+    levels = [quantized.tobytes()]
+    for i in range(1, 4):
+        size = width // pow(2, i), height // pow(2, i)
+
+        if mip_filter == 'box':
+            level = quantize(img.resize(size, Image.BOX), compatible)
+
+        else:
+            level = quantized.resize(size)
+
+        levels.append(level.tobytes())
+
+    pixels = b''.join(levels)
+
+    offsets = [wad.Miptexture.size]
+    for level in levels[:-1]:
+        offsets.append(offsets[-1] + len(level))
+
+    header = struct.pack(wad.Miptexture.format, name(file).encode('ascii'), width, height, *offsets)
+
+    return header + pixels
+
+
+def name(file):
+    """Returns the lump name for the given file path."""
+    return os.path.basename(file).split('.')[0]
+
+
+def convert(file, type, compatible=False, mip_filter='nearest', cache=None):
+    """Converts an image file to a lump of the given type.
+
+    Args:
+        file: The image file path.
+
+        type: The lump type name, either 'QPIC' or 'MIPTEX'.
+
+        compatible: If True, colors are quantized as done by earlier versions.
+
+        mip_filter: How MIPTEX mip levels are downsampled.
+
+        cache: Optional. A Cache object to reuse lumps converted from the same
+            file contents with the same options.
+
+    Returns:
+        A tuple of the lump name and the lump data as bytes.
+    """
+    lump_name = name(file)
+
+    if cache:
+        key = cache.key(qcli.__version__, quantizer(compatible), type, lump_name, mip_filter, file_digest(file))
+        data = cache.get(key)
+
+        if data is not None:
+            return lump_name, data
+
+    if type == 'QPIC':
+        data = qpic(file, compatible)
+
+    else:
+        data = miptex(file, compatible, mip_filter)
+
+    if cache:
+        cache.put(key, data)
+
+    return lump_name, data
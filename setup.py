@@ -24,13 +24,19 @@ setup(
         'tabulate>=0.8.3',
         'watchdog>=0.9.0',
     ],
+    extras_require={
+        'numpy': ['numpy>=1.17'],
+    },
     entry_points={
         'console_scripts': [
             'bsp2svg=qcli.bsp2svg.cli:main',
             'bsp2wad=qcli.bsp2wad.cli:main',
             'image2spr=qcli.image2spr.cli:main',
             'pak=qcli.pak.cli:main',
+            'pakdiff=qcli.pakdiff.cli:main',
+            'pakpatch=qcli.pakpatch.cli:main',
             'qmount=qcli.qmount.cli:main',
+            'qoverlay=qcli.qoverlay.cli:main',
             'spr2image=qcli.spr2image.cli:main',
             'wad=qcli.wad.cli:main',
             'unpak=qcli.unpak.cli:main',
@@ -0,0 +1,42 @@
+import io
+import unittest
+
+from vgio.quake.bsp import bsp29
+
+from qcli.bsp import MappedBsp
+
+
+def miptexture(name, width, height):
+    result = bsp29.Miptexture()
+    result.name = name
+    result.width = width
+    result.height = height
+    result.offsets = [bsp29.Miptexture.size]
+
+    for i in range(3):
+        result.offsets.append(result.offsets[-1] + (width >> i) * (height >> i))
+
+    result.pixels = bytes(width * height * 85 // 64)
+
+    return result
+
+
+class TestMappedBsp(unittest.TestCase):
+    def setUp(self):
+        bsp = bsp29.Bsp()
+        bsp.visibilities = b''
+        bsp.lighting = b''
+        bsp.mark_surfaces = b''
+        bsp.miptextures = [miptexture('brick', 16, 16), None, miptexture('sky1', 32, 16)]
+
+        self.file = io.BytesIO()
+        bsp.save(self.file)
+
+    def test_texture_names(self):
+        with MappedBsp(self.file) as bsp_file:
+            self.assertEqual(bsp_file.texture_names, ['brick', None, 'sky1'])
+            self.assertEqual([m.name if m else None for m in bsp_file.miptextures], bsp_file.texture_names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import gc
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from vgio.quake.bsp import bsp29
+
+from qcli.bsp2svg import api
+
+
+def build_bsp(path, size=32):
+    """Writes a bsp file with one model made of a size by size grid of
+    square faces."""
+    bsp = bsp29.Bsp()
+    bsp.visibilities = b''
+    bsp.lighting = b''
+    bsp.mark_surfaces = b''
+
+    bsp.planes = [bsp29.Plane(0, 0, 1, 0, 2)]
+    bsp.vertexes = [bsp29.Vertex(x * 16, y * 16, 0) for y in range(size + 1) for x in range(size + 1)]
+
+    # Edge 0 is never referenced by a surfedge
+    bsp.edges = [bsp29.Edge(0, 0)]
+
+    for y in range(size):
+        for x in range(size):
+            corner = y * (size + 1) + x
+            corners = corner, corner + 1, corner + size + 2, corner + size + 1
+            first_edge = len(bsp.surf_edges)
+
+            for i in range(4):
+                bsp.surf_edges.append(len(bsp.edges))
+                bsp.edges.append(bsp29.Edge(corners[i], corners[(i + 1) % 4]))
+
+            bsp.faces.append(bsp29.Face(0, 0, first_edge, 4, -1, 0, 0, 0, 0, -1))
+
+    bsp.models = [bsp29.Model(0, 0, 0, size * 16, size * 16, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, len(bsp.faces))]
+
+    with open(path, 'wb') as file:
+        bsp.save(file)
+
+
+class TestModel(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'grid.bsp')
+        build_bsp(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        bsp = api.Bsp.open(self.path)
+
+        for model in bsp.models:
+            self.assertEqual(len(model.vertexes), 33 * 33)
+            self.assertEqual(len(model.edges), 32 * 32 * 4)
+
+    def test_loading_does_not_retain_memory(self):
+        # Warm up caches that are filled once per process
+        self.load()
+
+        tracemalloc.start()
+
+        try:
+            self.load()
+            gc.collect()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+            for _ in range(10):
+                self.load()
+
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(retained, 64 * 1024, f'{retained} bytes retained after loading 10 maps')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from vgio.quake import pak
+
+from qcli.unpak import cli
+
+
+def unpak(*args):
+    stderr = io.StringIO()
+
+    with mock.patch('sys.argv', ['unpak', *args]), contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+        try:
+            cli.main()
+
+        except SystemExit as e:
+            return e.code, stderr.getvalue()
+
+    return 0, stderr.getvalue()
+
+
+class TestChecksums(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.pak')
+
+        with pak.PakFile(self.path, 'w') as pak_file:
+            pak_file.writestr('maps/start.bsp', b'start')
+
+        self.assertEqual(unpak(self.path, '--write-checksums'), (0, ''))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_added_member(self):
+        with pak.PakFile(self.path, 'a') as pak_file:
+            pak_file.writestr('maps/e1m1.bsp', b'e1m1')
+
+        code, stderr = unpak(self.path, '-t')
+
+        self.assertEqual(code, 1)
+        self.assertEqual(stderr, 'unpak: error: maps/e1m1.bsp: not in checksums file\n')
+
+    def test_selected_members(self):
+        with pak.PakFile(self.path, 'a') as pak_file:
+            pak_file.writestr('maps/e1m1.bsp', b'e1m1')
+
+        self.assertEqual(unpak(self.path, '-t', 'maps/start.bsp'), (0, ''))
+
+
+class TestCorruptArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        path = os.path.join(self.directory.name, 'bad.pak')
+
+        with open(path, 'wb') as file:
+            file.write(data)
+
+        return path
+
+    def assertCorrupt(self, path):
+        for args in ([path, '-t'], [path, '--write-checksums'], [path, '-l']):
+            with self.subTest(args=args):
+                code, stderr = unpak(*args)
+
+                self.assertEqual(code, 1)
+                self.assertEqual(stderr, f'unpak: error: {path} is truncated or corrupt\n')
+
+    def test_truncated_header(self):
+        self.assertCorrupt(self.write(b'PACK\x0c\x00'))
+
+    def test_partial_directory_entry(self):
+        data = struct.pack(pak.Header.format, pak.IDENTITY, pak.Header.size, 0x41)
+        self.assertCorrupt(self.write(data + bytes(0x41)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from vgio.quake import wad
+
+from qcli.unwad import cli
+
+
+class TestCorruptArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        path = os.path.join(self.directory.name, 'bad.wad')
+
+        with open(path, 'wb') as file:
+            file.write(data)
+
+        return path
+
+    def unwad(self, *args):
+        stderr = io.StringIO()
+
+        with mock.patch('sys.argv', ['unwad', *args]), contextlib.redirect_stderr(stderr):
+            with self.assertRaises(SystemExit) as context:
+                cli.main()
+
+        return context.exception.code, stderr.getvalue()
+
+    def assertCorrupt(self, path):
+        for args in ([path, '-t'], [path, '--write-checksums'], [path, '-l']):
+            with self.subTest(args=args):
+                code, stderr = self.unwad(*args)
+
+                self.assertEqual(code, 1)
+                self.assertEqual(stderr, f'unwad: error: {path} is truncated or corrupt\n')
+
+    def test_truncated_header(self):
+        self.assertCorrupt(self.write(b'WAD2\x01\x00'))
+
+    def test_negative_lump_count(self):
+        data = struct.pack(wad.Header.format, wad.IDENTITY, -1, wad.Header.size)
+        self.assertCorrupt(self.write(data + bytes(wad.Entry.size)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from qcli.wad import converter
+
+
+class TestMiptex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def image(self, width, height):
+        path = os.path.join(self.directory.name, 'brick.png')
+        Image.new('RGB', (width, height), 'red').save(path)
+
+        return path
+
+    def test_invalid_sizes(self):
+        for size in ((4, 4), (20, 16), (16, 4)):
+            path = self.image(*size)
+
+            for mip_filter in ('nearest', 'box'):
+                with self.subTest(size=size, mip_filter=mip_filter):
+                    with self.assertRaisesRegex(ValueError, 'not a valid miptexture size'):
+                        converter.miptex(path, mip_filter=mip_filter)
+
+    def test_mip_levels(self):
+        data = converter.miptex(self.image(24, 16))
+
+        self.assertEqual(len(data), 40 + 24 * 16 * 85 // 64)
+
+
+if __name__ == '__main__':
+    unittest.main()